@@ -0,0 +1,196 @@
+"""Admission control under overload: checkout latency while a sale-day
+flood of searches and cart calls arrives faster than the server answers.
+
+Requests arrive open-loop, at Poisson times fixed in advance whether or
+not earlier ones have been answered, over in-process ASGI. The flood is
+searches, cart views and cart adds from SESSIONS shoppers, plus BOTS
+sessions that search far faster than anyone browses. Alongside it, new
+buyers add to cart and check out at a steady rate. Capacity is measured
+first with the flood alone, closed-loop, and the flood is then offered
+at OVERLOAD times that, once with admission control off and once on,
+with the per-session rate limit. Latency counts from each request's
+scheduled arrival, so time spent behind a backlog is counted in full.
+
+Usage: python benchmarks/bench_admission.py [--overload 2] [--duration 10]
+                                            [--checkout-rate 20] [--bots 4]
+                                            [--session-rate 20] [--products 10000]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from load_asgi import call
+from synthetic import QUERIES, populate
+
+import server.main
+from server.main import Histogram, ResponseCache, Storage, TokenBuckets, admission
+
+SESSIONS = 2000
+BOT_RATE = 200  # searches a second, per bot
+
+
+def fresh_storage(products: int) -> list:
+    """Point the app at a new catalog with stock to spare; returns the
+    active product ids."""
+    storage = server.main.storage = populate(Storage(), products)
+    server.main.response_cache = ResponseCache()
+    ids = []
+    for product in storage.get_products():
+        if product["status"] == "active":
+            storage.update_product(product["id"], {"stock": 10**9})
+            ids.append(product["id"])
+    return ids
+
+
+def flood_request(rng: random.Random, product_ids: list) -> tuple:
+    session_id = f"shopper-{rng.randrange(SESSIONS)}"
+    kind = rng.random()
+    if kind < 0.5:
+        query = rng.choice(QUERIES).replace(" ", "+")
+        return [("search", "GET", f"/api/products?search={query}&limit=24", session_id, None)]
+    if kind < 0.75:
+        return [("cart view", "GET", "/api/cart?summary=true", session_id, None)]
+    line = {"productId": rng.choice(product_ids), "quantity": 1}
+    return [("cart add", "POST", "/api/cart", session_id, line)]
+
+
+def checkout_request(rng: random.Random, product_ids: list, n: int) -> tuple:
+    session_id = f"buyer-{n}"
+    line = {"productId": rng.choice(product_ids), "quantity": 1}
+    buyer = {"buyerName": "Load Test", "buyerEmail": "load@example.com"}
+    return [
+        ("buyer cart add", "POST", "/api/cart", session_id, line),
+        ("checkout", "POST", "/api/checkout", session_id, buyer),
+    ]
+
+
+async def timed(requests: list, scheduled: float, stats: dict):
+    """Run requests in order, stopping at the first refusal. The first is
+    timed from its scheduled arrival, each later one from when the one
+    before it was answered."""
+    start = scheduled
+    for i, (label, method, path, session_id, body) in enumerate(requests):
+        if i:
+            await asyncio.sleep(0)  # arrive behind whatever is ready, like a new request
+        status, _ = await call(method, path, session_id, body)
+        end = time.perf_counter()
+        entry = stats.get(label)
+        if entry is None:
+            entry = stats[label] = {"latency": Histogram(1e-6, 25), "statuses": {}}
+        entry["latency"].observe(end - start)
+        entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+        if status != 200:
+            break
+        start = end
+
+
+async def arrivals(rate: float, make, deadline: float, seed: int, stats: dict, tasks: list):
+    rng = random.Random(seed)
+    at = time.perf_counter()
+    n = 0
+    while True:
+        at += rng.expovariate(rate)
+        if at >= deadline:
+            return
+        delay = at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        requests = make(rng, n)
+        n += 1
+        tasks.append(asyncio.create_task(timed(requests, at, stats)))
+
+
+async def capacity(product_ids: list, seconds: float, users: int = 32) -> float:
+    """Flood requests a second the app completes when nothing queues."""
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    async def user(n: int):
+        nonlocal done
+        rng = random.Random(n)
+        while time.perf_counter() < deadline:
+            for _, *request in flood_request(rng, product_ids):
+                await call(*request)
+            done += 1
+
+    await asyncio.gather(*(user(n) for n in range(users)))
+    return done / seconds
+
+
+async def overload(product_ids: list, flood_rate: float, args) -> dict:
+    stats = {}
+    tasks = []
+    deadline = time.perf_counter() + args.duration
+    sources = [
+        arrivals(flood_rate, lambda rng, n: flood_request(rng, product_ids), deadline, 1, stats, tasks),
+        arrivals(
+            args.checkout_rate,
+            lambda rng, n: checkout_request(rng, product_ids, n),
+            deadline, 2, stats, tasks,
+        ),
+    ]
+    for bot in range(args.bots):
+        session_id = f"bot-{bot}"
+
+        def search(rng, n, session_id=session_id):
+            query = rng.choice(QUERIES).replace(" ", "+")
+            return [("bot search", "GET", f"/api/products?search={query}&limit=24", session_id, None)]
+
+        sources.append(arrivals(BOT_RATE, search, deadline, 100 + bot, stats, tasks))
+    start = time.perf_counter()
+    await asyncio.gather(*sources)
+    await asyncio.gather(*tasks)
+    return stats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--overload", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--checkout-rate", type=float, default=20.0)
+    parser.add_argument("--bots", type=int, default=4)
+    parser.add_argument("--session-rate", type=float, default=20.0)
+    parser.add_argument("--products", type=int, default=10_000)
+    args = parser.parse_args()
+    limit, burst = admission.limit or 8, admission.buckets.burst
+
+    admission.limit = 0
+    admission.buckets = TokenBuckets(0, 0)
+    product_ids = fresh_storage(args.products)
+    rate = asyncio.run(capacity(product_ids, 3.0))
+    flood_rate = rate * args.overload
+    print(
+        f"capacity {rate:.0f} flood req/s; offering {flood_rate:.0f}/s + {args.bots} bots x "
+        f"{BOT_RATE}/s + {args.checkout_rate:.0f} checkouts/s for {args.duration:.0f}s"
+    )
+    print(
+        f"{'admission':<10} {'request':<14} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} "
+        f"{'max ms':>9}  statuses"
+    )
+    for label, enabled in [("off", False), ("on", True)]:
+        admission.limit = limit if enabled else 0
+        admission.buckets = TokenBuckets(args.session_rate if enabled else 0, burst)
+        product_ids = fresh_storage(args.products)
+        stats, elapsed = asyncio.run(overload(product_ids, flood_rate, args))
+        for name in ["checkout", "buyer cart add", "cart add", "cart view", "search", "bot search"]:
+            entry = stats.get(name)
+            if entry is None:
+                continue
+            latency = entry["latency"]
+            statuses = " ".join(f"{k}:{v}" for k, v in sorted(entry["statuses"].items()))
+            print(
+                f"{label:<10} {name:<14} {latency.count:>7} {latency.quantile(0.5) * 1e3:>9.1f} "
+                f"{latency.quantile(0.99) * 1e3:>9.1f} {latency.quantile(1.0) * 1e3:>9.1f}  {statuses}"
+            )
+        control = admission.stats()
+        print(
+            f"{label:<10} drained in {elapsed:.1f}s; shed {sum(control['shed'].values())}, "
+            f"rate limited {control['rateLimited']}"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Throughput of batch endpoints vs one request per item, through ASGI.
+
+Usage: python benchmarks/bench_batch.py [ITEMS]
+"""
+
+import sys
+import time
+
+from fastapi.testclient import TestClient
+from synthetic import make_products
+
+from server.main import app
+
+ORDER = {
+    "sellerId": "seller-1",
+    "buyerName": "Bench Buyer",
+    "buyerEmail": "bench@example.com",
+    "total": "42.00",
+    "status": "pending",
+}
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(count: int):
+    client = TestClient(app)
+    products = list(make_products(count))
+    cart_lines = [{"productId": f"prod-{i % 8 + 1}", "quantity": 1} for i in range(count)]
+    single_cart = {"X-Session-ID": "bench-single"}
+    batch_cart = {"X-Session-ID": "bench-batch"}
+
+    cases = [
+        (
+            "products",
+            lambda: [client.post("/api/products", json=p) for p in products],
+            lambda: client.post("/api/products:batch", json=products),
+        ),
+        (
+            "cart",
+            lambda: [client.post("/api/cart", json=c, headers=single_cart) for c in cart_lines],
+            lambda: client.patch("/api/cart:batch", json=cart_lines, headers=batch_cart),
+        ),
+        (
+            "orders",
+            lambda: [client.post("/api/orders", json=ORDER) for _ in range(count)],
+            lambda: client.post("/api/orders:batch", json=[ORDER] * count),
+        ),
+    ]
+
+    print(f"{'resource':<10} {'items':>6} {'single items/s':>15} {'batch items/s':>14} {'speedup':>8}")
+    for name, single, batch in cases:
+        single_s = timed(single)
+        batch_s = timed(batch)
+        print(
+            f"{name:<10} {count:>6} {count / single_s:>15.0f} "
+            f"{count / batch_s:>14.0f} {single_s / batch_s:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
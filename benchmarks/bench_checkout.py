@@ -0,0 +1,123 @@
+"""Checkouts/sec on a single hot SKU, and a check that it never oversells.
+
+Every buyer thread loops add-to-cart (one unit of the hot product, plus a
+unit of a cold product every other time) then checkout, until the hot
+product sells out. Afterwards the units sold must equal the starting
+stock exactly, stock must be zero, and seller stats must match their
+recompute. Before that, cart lines of zero or fewer units must be
+refused when added and, if one gets into a cart anyway, at checkout,
+with stock and orders untouched.
+
+Usage: python benchmarks/bench_checkout.py [STOCK] [THREADS ...]
+"""
+
+import sys
+import threading
+import time
+
+import synthetic  # noqa: F401  (puts the repo root on sys.path)
+
+from server.main import CheckoutError, Storage
+
+HOT = "prod-1"
+COLD = [f"prod-{i}" for i in range(2, 9)]
+BUYER = {"buyerName": "Bench Buyer", "buyerEmail": "bench@example.com"}
+
+
+def buyer(storage: Storage, n: int, sold: list, rejected: list):
+    session = f"hot-{n}"
+    units = refusals = 0
+    i = 0
+    while True:
+        i += 1
+        storage.add_to_cart({"sessionId": session, "productId": HOT, "quantity": 1})
+        if i % 2:
+            storage.add_to_cart(
+                {"sessionId": session, "productId": COLD[i % len(COLD)], "quantity": 1}
+            )
+        try:
+            storage.checkout(session, BUYER)
+            units += 1
+        except CheckoutError as exc:
+            if any(p["productId"] == HOT and p.get("available") == 0 for p in exc.problems):
+                break
+            refusals += 1
+    storage.clear_cart(session)
+    sold.append(units)
+    rejected.append(refusals)
+
+
+def run(stock: int, threads: int) -> bool:
+    storage = Storage()
+    storage.update_product(HOT, {"stock": stock})
+    for product_id in COLD:
+        storage.update_product(product_id, {"stock": 10**9})
+    sold, rejected = [], []
+    workers = [
+        threading.Thread(target=buyer, args=(storage, n, sold, rejected))
+        for n in range(threads)
+    ]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    problems = []
+    if sum(sold) != stock:
+        problems.append(f"sold {sum(sold)} of {stock}")
+    if storage.products[HOT].stock != 0:
+        problems.append(f"stock left at {storage.products[HOT].stock}")
+    for seller_id in {p.sellerId for p in storage.products.values()}:
+        if not storage.check_seller_stats(seller_id)["consistent"]:
+            problems.append(f"{seller_id}: seller stats drifted")
+    print(
+        f"{threads:>7} {sum(sold):>9} {sum(sold) / elapsed:>14.0f} "
+        f"{len(storage.orders):>7} {'ok' if not problems else 'FAILED'}"
+    )
+    for problem in problems:
+        print(f"    {problem}")
+    return not problems
+
+
+def check_quantities() -> bool:
+    storage = Storage()
+    stock, orders = storage.products[HOT].stock, len(storage.orders)
+    problems = []
+    for quantity in (0, -5):
+        try:
+            storage.add_to_cart({"sessionId": "bad", "productId": HOT, "quantity": quantity})
+            problems.append(f"added a line of {quantity}")
+        except ValueError:
+            pass
+    # Storage.update_cart_item trusts its caller, so a line can still
+    # reach checkout with a bad quantity.
+    for quantity in (0, -5):
+        item = storage.add_to_cart({"sessionId": "bad", "productId": HOT, "quantity": 1})
+        storage.update_cart_item(item["id"], quantity)
+        try:
+            storage.checkout("bad", BUYER)
+            problems.append(f"checked out a line of {quantity}")
+        except CheckoutError as exc:
+            if [p["issue"] for p in exc.problems] != ["invalid_quantity"]:
+                problems.append(f"line of {quantity}: {exc.problems}")
+        storage.clear_cart("bad")
+    if storage.products[HOT].stock != stock or len(storage.orders) != orders:
+        problems.append("a refused checkout changed stock or orders")
+    print(f"non-positive quantities: {'ok' if not problems else 'FAILED'}")
+    for problem in problems:
+        print(f"    {problem}")
+    return not problems
+
+
+def main(stock: int, thread_counts):
+    ok = check_quantities()
+    print(f"{'threads':>7} {'checkouts':>9} {'checkouts/s':>14} {'orders':>7} result")
+    ok = all([run(stock, threads) for threads in thread_counts]) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0] if args else 20_000, args[1:] or [1, 4, 16, 64])
@@ -0,0 +1,112 @@
+"""Response compression and static assets: bytes on the wire and CPU per
+request for each configuration.
+
+Catalog listings are fetched over in-process ASGI with each
+Accept-Encoding, once with the response cache on (each encoding is
+compressed once per catalog version and reused) and once with it off
+(every request serializes and compresses afresh). "br" rows need the
+optional brotli package. Static assets are a whole PNG and a 64 KiB
+Range of it.
+
+Usage: python benchmarks/bench_compression.py [PRODUCTS] [--requests 200]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from synthetic import populate
+
+import server.main
+from server.main import ASSETS_DIR, ResponseCache, Storage, app, brotli
+
+ENDPOINTS = [
+    ("/api/products", "limit=50"),
+    ("/api/products", ""),
+]
+ENCODINGS = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+ASSET = "generated_images/hero_lifestyle_product_collection.png"
+
+
+async def fetch(path: str, query: str, headers: dict) -> int:
+    """Returns the response body's size on the wire."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench")]
+        + [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Future()
+
+    size = 0
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return size
+
+
+async def measure(path: str, query: str, headers: dict, requests: int):
+    """(bytes per response, CPU microseconds per request)."""
+    await fetch(path, query, headers)  # warm the cache, if it is on
+    start = time.process_time()
+    for _ in range(requests):
+        size = await fetch(path, query, headers)
+    return size, (time.process_time() - start) / requests * 1e6
+
+
+async def run(products: int, requests: int):
+    server.main.storage = populate(Storage(), products)
+    print(f"{products} products; brotli {'available' if brotli else 'not installed'}")
+    print(f"{'request':<36} {'cache':<5} {'encoding':<9} {'bytes':>9} {'CPU us/req':>11}")
+    for path, query in ENDPOINTS:
+        label = path + (f"?{query}" if query else "")
+        for cached in (True, False):
+            server.main.response_cache = ResponseCache(max_entries=2048 if cached else 0)
+            for encoding in ENCODINGS:
+                size, cpu = await measure(path, query, {"Accept-Encoding": encoding}, requests)
+                print(f"{label:<36} {'on' if cached else 'off':<5} {encoding:<9} {size:>9} {cpu:>11.1f}")
+
+    asset = "/assets/" + ASSET
+    full = os.path.getsize(os.path.join(ASSETS_DIR, ASSET))
+    for label, headers in [
+        ("whole file", {}),
+        ("Range 64 KiB", {"Range": "bytes=0-65535"}),
+        ("If-None-Match", {"If-None-Match": "*"}),
+    ]:
+        size, cpu = await measure(asset, "", headers, requests)
+        print(f"{'asset ' + label:<36} {'-':<5} {'-':<9} {size:>9} {cpu:>11.1f}")
+    print(f"(asset is {full} bytes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("products", type=int, nargs="?", default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.products, args.requests))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Server-sent event fan-out: what subscribers cost writers, and what
+slow subscribers receive.
+
+SUBSCRIBERS clients stream /api/events over in-process ASGI, each
+following one seller's dashboard and one of a few hot products. One in
+ten is slow, taking 50 ms to accept each write. A writer then updates
+the hot products' stock UPDATES times. The run reports the writer's
+latency, how many frames fast and slow clients got, and the hub's
+coalesced and reset counts. Run it with 0 subscribers for a baseline.
+
+Usage: python benchmarks/bench_events.py [SUBSCRIBERS ...] [--updates 5000]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import synthetic  # noqa: F401  (puts the repo root on sys.path)
+
+from server.main import Histogram, app, event_hub, storage
+
+HOT_PRODUCTS = [f"prod-{i}" for i in range(1, 5)]
+
+
+async def subscribe(n: int, slow: bool, received: list, stop: asyncio.Event):
+    product = HOT_PRODUCTS[n % len(HOT_PRODUCTS)]
+    query = f"seller=seller-{n % 3 + 1}&product={product}"
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/events",
+        "raw_path": b"/api/events",
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000 + n),
+        "server": ("bench", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await stop.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            received[n] += message.get("body", b"").count(b"\nevent: ")
+            if slow:
+                await asyncio.sleep(0.05)
+
+    await app(scope, receive, send)
+
+
+async def run(subscribers: int, updates: int):
+    stop = asyncio.Event()
+    received = [0] * subscribers
+    clients = [
+        asyncio.create_task(subscribe(n, n % 10 == 9, received, stop))
+        for n in range(subscribers)
+    ]
+    while event_hub.stats()["subscribers"] < subscribers:
+        await asyncio.sleep(0.01)
+    before = event_hub.stats()
+
+    latency = Histogram(1e-7, 25)
+    start = time.perf_counter()
+    for i in range(updates):
+        t = time.perf_counter()
+        storage.update_product(HOT_PRODUCTS[i % len(HOT_PRODUCTS)], {"stock": 1000 + i})
+        latency.observe(time.perf_counter() - t)
+        if i % 50 == 0:
+            await asyncio.sleep(0)  # let the pump and the clients run
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(event_hub.poll_timeout + 0.2)
+    after = event_hub.stats()
+    stop.set()
+    await asyncio.gather(*clients)
+
+    fast = [c for n, c in enumerate(received) if n % 10 != 9]
+    slow = [c for n, c in enumerate(received) if n % 10 == 9]
+    print(
+        f"{subscribers:>11} {updates / elapsed:>10.0f} {latency.quantile(0.5) * 1e6:>8.1f} "
+        f"{latency.quantile(0.99) * 1e6:>8.1f} "
+        f"{sum(fast) / max(1, len(fast)):>10.0f} {sum(slow) / max(1, len(slow)):>10.0f} "
+        f"{after['coalesced'] - before['coalesced']:>10} {after['resets'] - before['resets']:>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("subscribers", type=int, nargs="*", default=[0, 100, 1000])
+    parser.add_argument("--updates", type=int, default=5000)
+    args = parser.parse_args()
+    print(
+        f"{'subscribers':>11} {'updates/s':>10} {'p50 us':>8} {'p99 us':>8} "
+        f"{'fast got':>10} {'slow got':>10} {'coalesced':>10} {'resets':>7}"
+    )
+    for subscribers in args.subscribers:
+        asyncio.run(run(subscribers, args.updates))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
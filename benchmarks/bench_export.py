@@ -0,0 +1,106 @@
+"""Full-history order download: the /api/seller/orders JSON array vs the
+streaming /api/seller/orders/export (NDJSON and CSV).
+
+One seller gets every order. Each endpoint is driven over ASGI with the
+body discarded as it arrives, so the numbers are time to first byte,
+total time and the peak Python heap (tracemalloc, measured in a separate
+run) that serving the response needs.
+
+Usage: python benchmarks/bench_export.py [ORDERS ...]
+"""
+
+import asyncio
+import sys
+import time
+import tracemalloc
+
+import synthetic  # noqa: F401  (puts the repo root on sys.path)
+
+from server.main import Storage, app
+import server.main
+
+ENDPOINTS = [
+    ("GET /api/seller/orders (array)", "/api/seller/orders", "seller_id=seller-bench"),
+    ("export ndjson", "/api/seller/orders/export", "seller_id=seller-bench"),
+    ("export csv", "/api/seller/orders/export", "seller_id=seller-bench&format=csv"),
+]
+
+
+async def fetch(path: str, query: str):
+    """Returns (seconds to first body byte, total seconds, body bytes)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Future()
+
+    first = None
+    size = 0
+    start = time.perf_counter()
+
+    async def send(message):
+        nonlocal first, size
+        if message["type"] == "http.response.body" and message.get("body"):
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(message["body"])
+
+    await app(scope, receive, send)
+    return first, time.perf_counter() - start, size
+
+
+def peak_bytes(path: str, query: str) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    asyncio.run(fetch(path, query))
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return peak
+
+
+def main(sizes):
+    print(f"{'orders':>8} {'endpoint':<32} {'first byte ms':>14} {'total ms':>9} {'MB':>7} {'peak MB':>8}")
+    for size in sizes:
+        storage = Storage()
+        storage.create_orders(
+            [
+                {
+                    "sellerId": "seller-bench",
+                    "buyerName": f"Buyer {n}",
+                    "buyerEmail": f"buyer{n}@example.com",
+                    "total": f"{n % 900 + 5}.99",
+                    "status": "pending",
+                }
+                for n in range(size)
+            ]
+        )
+        server.main.storage = storage
+        for label, path, query in ENDPOINTS:
+            first, total, body = asyncio.run(fetch(path, query))
+            peak = peak_bytes(path, query)
+            print(
+                f"{size:>8} {label:<32} {first * 1e3:>14.1f} {total * 1e3:>9.0f} "
+                f"{body / 1e6:>7.1f} {peak / 1e6:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,82 @@
+"""Bulk product import: rows/sec for an NDJSON or CSV feed, sequential
+vs. validated in a process pool.
+
+The feed is written to a temp file first, then read back through the
+same read_feed/import_feed pipeline the import CLI and endpoint use,
+into an empty in-memory Storage. The garbage collector is off, as in the
+import CLI.
+
+Usage: python benchmarks/bench_import.py [ROWS] [--format ndjson|csv]
+                                         [--workers 0 4] [--chunk-size 5000]
+"""
+
+import argparse
+import csv
+import gc
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from synthetic import make_products
+
+from server.main import IMPORT_CHUNK_SIZE, ProductRecord, Storage, import_feed, read_feed
+
+
+def write_feed(path: str, rows: int, feed_format: str):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if feed_format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(ProductRecord.FIELDS[1:12])
+            for product in make_products(rows):
+                writer.writerow(
+                    [
+                        "|".join(v) if isinstance(v, list) else v
+                        for v in (product[field] for field in ProductRecord.FIELDS[1:12])
+                    ]
+                )
+        else:
+            for product in make_products(rows):
+                f.write(json.dumps(product) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", type=int, nargs="?", default=200_000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 4])
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=f".{args.format}")
+    os.close(fd)
+    try:
+        write_feed(path, args.rows, args.format)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{args.rows} rows, {size_mb:.0f} MB {args.format}")
+        gc.disable()
+        print(f"{'workers':>7} {'seconds':>8} {'rows/s':>9} {'failed':>7} {'max RSS MB':>11}")
+        for workers in args.workers:
+            storage = Storage()
+            start = time.perf_counter()
+            with open(path, newline="", encoding="utf-8") as lines:
+                for report in import_feed(
+                    storage, read_feed(lines, args.format), args.chunk_size, workers
+                ):
+                    pass
+            elapsed = time.perf_counter() - start
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(
+                f"{workers:>7} {elapsed:>8.1f} {report['rows'] / elapsed:>9.0f} "
+                f"{report['failed']:>7} {rss:>11.0f}"
+            )
+            storage.close()
+            del storage
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
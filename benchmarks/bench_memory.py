@@ -0,0 +1,64 @@
+"""Bytes per product for plain dicts vs ProductRecord, measured with tracemalloc.
+
+Every product is decoded from JSON first, so its strings are fresh
+objects, as they would be when they arrive in a request body.
+
+Usage: python benchmarks/bench_memory.py [SIZE ...]
+"""
+
+import json
+import sys
+import tracemalloc
+from uuid import uuid4
+
+from synthetic import make_products
+
+from server.main import ProductRecord
+
+
+def as_dict(payload: dict) -> dict:
+    return {"id": str(uuid4()), "rating": "0", "reviewCount": 0, **payload}
+
+
+def as_record(payload: dict) -> ProductRecord:
+    return ProductRecord(as_dict(payload))
+
+
+def as_record_with_json(payload: dict) -> ProductRecord:
+    record = as_record(payload)
+    record.json()
+    return record
+
+
+def measure(build, size: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = {}
+    for payload in make_products(size):
+        item = build(json.loads(json.dumps(payload)))
+        store[item["id"]] = item
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del store
+    return used / size
+
+
+def main(sizes):
+    print(f"{'size':>9} {'representation':<26} {'bytes/product':>14}")
+    for size in sizes:
+        baseline = None
+        for label, build in (
+            ("dict", as_dict),
+            ("ProductRecord", as_record),
+            ("ProductRecord + JSON", as_record_with_json),
+        ):
+            per_product = measure(build, size)
+            baseline = baseline or per_product
+            print(
+                f"{size:>9} {label:<26} {per_product:>14.0f}"
+                f"  ({per_product / baseline:.0%} of dict)"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000_000])
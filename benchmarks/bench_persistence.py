@@ -0,0 +1,72 @@
+"""Write throughput of the in-memory and journaled Storage backends.
+
+Each writer thread mirrors a request handler: it mutates Storage and then
+waits for the write to become durable. With several writers waiting at once, group commit
+lets them share one fsync.
+
+Usage: python benchmarks/bench_persistence.py [WRITES] [WRITERS ...]
+"""
+
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import synthetic  # noqa: F401  (puts the repo root on sys.path)
+
+from server.main import Storage
+
+ORDER = {
+    "sellerId": "seller-1",
+    "buyerName": "Bench Buyer",
+    "buyerEmail": "bench@example.com",
+    "total": "42.00",
+    "status": "pending",
+}
+
+
+def run(storage: Storage, writes: int, writers: int, op: str) -> float:
+    per_writer = writes // writers
+
+    def writer(n: int):
+        session = f"bench-{n}"
+        for i in range(per_writer):
+            if op == "order":
+                storage.create_order(ORDER)
+            else:
+                storage.add_to_cart(
+                    {"sessionId": session, "productId": f"prod-{i % 8 + 1}", "quantity": 1}
+                )
+            storage.sync()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return per_writer * writers / (time.perf_counter() - start)
+
+
+def main(writes: int, writer_counts):
+    print(f"{'backend':<10} {'op':<6} {'writers':>7} {'writes/s':>10} {'fsyncs':>8}")
+    for op in ("order", "cart"):
+        for writers in writer_counts:
+            rate = run(Storage(), writes, writers, op)
+            print(f"{'memory':<10} {op:<6} {writers:>7} {rate:>10.0f} {'-':>8}")
+
+            data_dir = tempfile.mkdtemp(prefix="shop-bench-")
+            try:
+                storage = Storage(data_dir=data_dir, snapshot_every=10**9)
+                rate = run(storage, writes, writers, op)
+                batches = storage._journal.batches
+                storage.close()
+                print(f"{'journal':<10} {op:<6} {writers:>7} {rate:>10.0f} {batches:>8}")
+            finally:
+                shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else 5000, args[1:] or [1, 8, 64])
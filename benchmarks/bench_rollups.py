@@ -0,0 +1,111 @@
+"""Seller sales time series: the rollups vs computing them from the orders.
+
+ORDERS orders over three years, in time order, are spread across SELLERS
+sellers with a skew toward a few big ones. Each is folded into the sales
+rollups the way create_order does. The biggest seller's day, week and
+month series are then read for the last 90 days, the last year and all
+time: once from the rollups, through Storage.get_sales_timeseries, and
+once by scanning every order, which is what answering it from
+Storage.orders on demand would cost. Orders are held as (createdAt,
+seller, cents) tuples so that ten million fit in memory; a scan of the
+order dicts would be slower still.
+
+Usage: python benchmarks/bench_rollups.py [ORDERS] [--sellers 1000] [--repeat 200]
+"""
+
+import argparse
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+
+import synthetic  # noqa: F401  (puts the repo root on sys.path)
+
+from server.main import SALES_INTERVALS, Storage, bucket_starts, to_timestamp
+
+START = datetime(2023, 1, 1)
+SPAN = timedelta(days=3 * 365)
+
+
+def make_orders(count: int, sellers: int, seed: int = 0):
+    rng = random.Random(seed)
+    step = SPAN / count
+    names = [f"seller-{n}" for n in range(sellers)]
+    for n in range(count):
+        seller = names[min(sellers - 1, int(rng.paretovariate(1.1)) - 1)]
+        yield (START + step * n).isoformat(), seller, rng.randrange(500, 90_000)
+
+
+def scan(orders, seller_id: str, interval: str, since, until) -> dict:
+    """The series computed the on-demand way: one pass over every order."""
+    i = SALES_INTERVALS.index(interval)
+    low = bucket_starts(since[:10])[i] if since else None
+    buckets = {}
+    for created_at, seller, cents in orders:
+        if seller != seller_id or (until and created_at >= until):
+            continue
+        start = bucket_starts(created_at[:10])[i]
+        if low and start < low:
+            continue
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = [0, 0]
+        bucket[0] += cents
+        bucket[1] += 1
+    return buckets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("orders", type=int, nargs="?", default=10_000_000)
+    parser.add_argument("--sellers", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    storage = Storage()
+    orders = []
+    start = time.perf_counter()
+    for created_at, seller, cents in make_orders(args.orders, args.sellers):
+        orders.append((created_at, seller, cents))
+    generated = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for created_at, seller, cents in orders:
+        storage._roll_up_order({"sellerId": seller, "createdAt": created_at}, cents)
+    rolled = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{args.orders} orders generated in {generated:.1f}s; rolled up in {rolled:.1f}s "
+        f"({rolled / args.orders * 1e6:.2f} us/order); max RSS {rss:.0f} MB"
+    )
+
+    seller = "seller-0"
+    end = START + SPAN
+    ranges = [
+        ("90 days", (end - timedelta(days=90)).isoformat(), None),
+        ("1 year", (end - timedelta(days=365)).isoformat(), None),
+        ("all", None, None),
+    ]
+    print(f"{'interval':<8} {'range':<8} {'buckets':>8} {'rollup us':>10} {'scan ms':>9} {'speedup':>9}")
+    for interval in SALES_INTERVALS:
+        for label, since, until in ranges:
+            t = time.perf_counter()
+            for _ in range(args.repeat):
+                series = storage.get_sales_timeseries(seller, interval, since, until)
+            rollup = (time.perf_counter() - t) / args.repeat
+
+            t = time.perf_counter()
+            expected = scan(orders, seller, interval, since and to_timestamp(since), until)
+            scanned = time.perf_counter() - t
+            assert [b["orders"] for b in series["buckets"]] == [
+                expected[k][1] for k in sorted(expected)
+            ]
+            print(
+                f"{interval:<8} {label:<8} {len(series['buckets']):>8} {rollup * 1e6:>10.1f} "
+                f"{scanned * 1e3:>9.0f} {scanned / rollup:>8.0f}x"
+            )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Compare the inverted search index with the old linear substring scan.
+
+Usage: python benchmarks/bench_search.py [SIZE ...]
+"""
+
+import sys
+import time
+
+from synthetic import QUERIES, populate
+
+from server.main import Storage
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def linear_scan(products: dict, search: str):
+    search_lower = search.lower()
+    return [
+        p
+        for p in products.values()
+        if search_lower in p["name"].lower()
+        or search_lower in p["description"].lower()
+    ]
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes):
+    print(f"{'size':>9} {'query':<22} {'hits':>8} {'scan ms':>10} {'index ms':>10} {'speedup':>8}")
+    for size in sizes:
+        storage = populate(Storage(), size)
+        for query in QUERIES:
+            hits = len(storage.get_products(search=query))
+            scan = best_of(lambda: linear_scan(storage.products, query), repeat=3)
+            index = best_of(lambda: storage.get_products(search=query, limit=24))
+            print(
+                f"{size:>9} {query:<22} {hits:>8} {scan * 1e3:>10.2f} "
+                f"{index * 1e3:>10.2f} {scan / index:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,40 @@
+"""Compare FastAPI's default serialization with the pre-encoded fast path.
+
+The default path is what a handler returning ``storage.get_products()``
+costs: ``jsonable_encoder`` followed by ``JSONResponse.render``. The fast
+path joins the per-product fragments Storage keeps encoded.
+
+Usage: python benchmarks/bench_serialization.py [SIZE ...]
+"""
+
+import sys
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from synthetic import populate
+
+from server.main import Storage
+
+
+def main(sizes):
+    print(f"{'size':>7} {'path':<28} {'us/req':>10} {'speedup':>8}")
+    for size in sizes:
+        storage = populate(Storage(), size)
+
+        def default_path():
+            return JSONResponse(jsonable_encoder(storage.get_products())).body
+
+        def fast_path():
+            return storage.get_products_json()
+
+        assert default_path() == fast_path()
+        number = max(1, 20_000 // size)
+        default = min(timeit.repeat(default_path, number=number, repeat=5)) / number
+        fast = min(timeit.repeat(fast_path, number=number, repeat=5)) / number
+        print(f"{size:>7} {'jsonable_encoder + dumps':<28} {default * 1e6:>10.0f} {'':>8}")
+        print(f"{size:>7} {'pre-encoded join':<28} {fast * 1e6:>10.0f} {default / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000])
@@ -0,0 +1,217 @@
+"""Micro-benchmarks for the Storage methods at several data sizes.
+
+For each size the store is filled with a synthetic catalog of that many
+products, a tenth as many carts, and as many orders and reviews, then
+every case is looped for at least --min-time seconds, three times. The
+best run is reported. Before timing anything, a deleted product must drop
+out of the related lists of the products it was carted with.
+
+Usage: python benchmarks/bench_storage.py [--sizes 1000 10000 100000]
+                                          [--only SUBSTRING] [--json PATH]
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+
+from results import write_results
+from synthetic import QUERIES, make_products, populate, populate_activity, populate_reviews
+
+from server.main import Storage
+
+BUYER = {"buyerName": "Bench Buyer", "buyerEmail": "bench@example.com"}
+
+
+def build(size: int):
+    storage = populate(Storage(), size)
+    product_ids = [p["id"] for p in storage.get_products()]
+    sessions = populate_activity(storage, product_ids, max(1, size // 10), size)
+    populate_reviews(storage, product_ids, size)
+    storage.refresh_related()
+    hot = product_ids[0]
+    storage.update_product(hot, {"stock": 10**9, "status": "active"})
+    sellers = sorted({storage.get_product(pid)["sellerId"] for pid in product_ids})
+    categories = sorted({storage.get_product(pid)["categoryId"] for pid in product_ids})
+    return storage, product_ids, sessions, sellers, categories, hot
+
+
+def check_related_delete() -> bool:
+    storage = populate(Storage(), 200)
+    ids = [p["id"] for p in storage.get_products() if p["status"] == "active"]
+    gone, others = ids[0], ids[1:6]
+    for n, other in enumerate(others):
+        for product_id in (gone, other):
+            storage.add_to_cart(
+                {"sessionId": f"related-{n}", "productId": product_id, "quantity": 1}
+            )
+    storage.refresh_related()
+
+    def related(product_id):
+        return [p["id"] for p in json.loads(storage.get_related_json(product_id))]
+
+    problems = [
+        f"{other} was never related to {gone}" for other in others if gone not in related(other)
+    ]
+    storage.delete_product(gone)
+    storage.refresh_related()
+    for other in others:
+        if gone in related(other) or gone in storage._related.neighbours(other):
+            problems.append(f"{other} still lists deleted {gone}")
+    print(f"related after delete: {'ok' if not problems else 'FAILED'}")
+    for problem in problems:
+        print(f"    {problem}")
+    return not problems
+
+
+def cases(storage: Storage, product_ids, sessions, sellers, categories, hot):
+    """(name, zero-argument callable) pairs; callables cycle through inputs."""
+    products = itertools.cycle(product_ids)
+    carts = itertools.cycle(sessions)
+    seller_cycle = itertools.cycle(sellers)
+    category_cycle = itertools.cycle(categories)
+    queries = itertools.cycle(QUERIES)
+    prices = itertools.cycle(f"{p / 100:.2f}" for p in range(500, 50_000, 7))
+    new_products = itertools.cycle(list(make_products(1000, seed=1)))
+    checkout_sessions = (f"bench-checkout-{n}" for n in itertools.count())
+    second_page = storage.get_products_page()["nextCursor"]
+    order = {
+        "sellerId": sellers[0],
+        "buyerName": "Bench Buyer",
+        "buyerEmail": "bench@example.com",
+        "total": "42.00",
+        "status": "pending",
+    }
+    batch = [{"productId": pid, "quantity": 1} for pid in product_ids[:10]]
+    review = {"rating": 4, "quote": "Does the job.", "name": "Bench Reviewer"}
+
+    def checkout():
+        session_id = next(checkout_sessions)
+        storage.add_to_cart({"sessionId": session_id, "productId": hot, "quantity": 1})
+        storage.checkout(session_id, BUYER)
+
+    return [
+        ("get_product_json", lambda: storage.get_product_json(next(products))),
+        ("get_product", lambda: storage.get_product(next(products))),
+        ("get_related_json", lambda: storage.get_related_json(next(products))),
+        (
+            "get_products_json[category,limit=50]",
+            lambda: storage.get_products_json(category_id=next(category_cycle), limit=50),
+        ),
+        (
+            "get_products_json[search,limit=50]",
+            lambda: storage.get_products_json(search=next(queries), limit=50),
+        ),
+        (
+            "get_products_json[price 20-40,sort=-rating,limit=50]",
+            lambda: storage.get_products_json(
+                limit=50, filters={"minPrice": "20", "maxPrice": "40"}, sort="-rating"
+            ),
+        ),
+        (
+            "get_products_json[rating>=4.8,in stock,sort=price,limit=50]",
+            lambda: storage.get_products_json(
+                limit=50, filters={"minRating": "4.8", "inStock": True}, sort="price"
+            ),
+        ),
+        (
+            "get_products_json[category,sort=-reviewCount,limit=50]",
+            lambda: storage.get_products_json(
+                category_id=next(category_cycle), limit=50, sort="-reviewCount"
+            ),
+        ),
+        (
+            "get_product_facets",
+            lambda: storage.get_product_facets(),
+        ),
+        (
+            "get_product_facets[price 20-40]",
+            lambda: storage.get_product_facets(filters={"minPrice": "20", "maxPrice": "40"}),
+        ),
+        (
+            "get_products_page_json[seller]",
+            lambda: storage.get_products_page_json(seller_id=next(seller_cycle)),
+        ),
+        (
+            "get_products_page_json[page 2]",
+            lambda: storage.get_products_page_json(cursor=second_page),
+        ),
+        ("get_orders_page[seller]", lambda: storage.get_orders_page(next(seller_cycle))),
+        ("get_seller_stats", lambda: storage.get_seller_stats(next(seller_cycle))),
+        (
+            "get_sales_timeseries[day]",
+            lambda: storage.get_sales_timeseries(next(seller_cycle), "day"),
+        ),
+        ("get_cart", lambda: storage.get_cart(next(carts))),
+        ("get_cart_summary", lambda: storage.get_cart_summary(next(carts))),
+        (
+            "add_to_cart",
+            lambda: storage.add_to_cart(
+                {"sessionId": next(carts), "productId": next(products), "quantity": 1}
+            ),
+        ),
+        ("update_cart[10 lines]", lambda: storage.update_cart(next(carts), batch)),
+        (
+            "update_product[price]",
+            lambda: storage.update_product(next(products), {"price": next(prices)}),
+        ),
+        ("create_product", lambda: storage.create_product(next(new_products))),
+        ("create_order", lambda: storage.create_order(order)),
+        ("add_review", lambda: storage.add_review(next(products), review)),
+        ("get_reviews_page[popular product]", lambda: storage.get_reviews_page(product_ids[0])),
+        ("get_top_reviews", lambda: storage.get_top_reviews(3)),
+        ("add_to_cart+checkout", checkout),
+    ]
+
+
+def measure(fn, min_time: float) -> float:
+    """Seconds per call: best of three runs of at least ``min_time`` each."""
+    fn()
+    best = float("inf")
+    for _ in range(3):
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            for _ in range(10):
+                fn()
+            calls += 10
+            elapsed = time.perf_counter() - start
+        best = min(best, elapsed / calls)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--only", help="run only cases whose name contains this")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    if not check_related_delete():
+        return 1
+
+    results = []
+    print(f"{'case':<60} {'size':>7} {'us/op':>10} {'ops/s':>10}")
+    for size in args.sizes:
+        built = build(size)
+        for name, fn in cases(*built):
+            if args.only and args.only not in name:
+                continue
+            seconds = measure(fn, args.min_time)
+            print(f"{name:<60} {size:>7} {seconds * 1e6:>10.1f} {1 / seconds:>10.0f}")
+            results.append(
+                {
+                    "name": f"{name}@{size}",
+                    "us_per_op": round(seconds * 1e6, 3),
+                    "ops_per_sec": round(1 / seconds, 1),
+                }
+            )
+        built[0].close()
+    if args.json:
+        write_results(args.json, "storage", results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Compare two benchmark result files (from --json) and flag regressions.
+
+Rows are matched by name. Throughput fields (ops_per_sec,
+requests_per_sec) should go up; latency fields (us_per_op, p50_ms,
+p95_ms, p99_ms) should go down. A change worse than --threshold percent
+counts as a regression, and the exit status is 1 if there are any.
+
+Usage: python benchmarks/compare.py BASE.json NEW.json [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("ops_per_sec", "requests_per_sec")
+LOWER_IS_BETTER = ("us_per_op", "p50_ms", "p95_ms", "p99_ms")
+
+
+def load(path: str) -> tuple:
+    """The results file's payload, and its result rows by name."""
+    with open(path) as f:
+        payload = json.load(f)
+    return payload, {row["name"]: row for row in payload["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    base_meta, base = load(args.base)
+    new_meta, new = load(args.new)
+    if base_meta["suite"] != new_meta["suite"]:
+        print(f"warning: comparing suite {base_meta['suite']!r} with {new_meta['suite']!r}")
+    print(f"base {base_meta['meta']['commit']}  new {new_meta['meta']['commit']}")
+    print(f"{'name':<48} {'metric':<16} {'base':>12} {'new':>12} {'change':>8}")
+
+    regressions = 0
+    for name, row in new.items():
+        before = base.get(name)
+        if before is None:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if metric not in row or metric not in before or not before[metric]:
+                continue
+            change = (row[metric] - before[metric]) / before[metric] * 100
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(
+                f"{name:<48} {metric:<16} {before[metric]:>12.3f} {row[metric]:>12.3f} "
+                f"{change:>+7.1f}%{flag}"
+            )
+    for name in sorted(base.keys() - new.keys()):
+        print(f"{name:<48} missing from new run")
+    print(f"{regressions} regression(s) beyond {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
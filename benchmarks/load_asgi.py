@@ -0,0 +1,244 @@
+"""In-process load generator: drives the FastAPI app directly over ASGI.
+
+No sockets or HTTP parsing are involved, so the numbers isolate the cost
+of routing, validation, Storage and serialization. Virtual users each
+have their own X-Session-ID. Each user repeatedly picks a scenario
+according to the traffic mix and runs its requests in order:
+
+    browse    categories, a category listing, a product page
+    search    a product search
+    cart      add to cart, view the cart
+    checkout  add to cart, check out
+    seller    seller products, orders and stats (the dashboard)
+
+Before the load, every paged route must answer 422 to a limit or offset
+out of bounds instead of serving or failing on it.
+
+Usage: python benchmarks/load_asgi.py [--mix shopper|sale|seller|browse=5,cart=1]
+                                      [--users 32] [--duration 10]
+                                      [--products 10000] [--json PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from results import write_results
+from synthetic import QUERIES, populate
+
+from server.main import Histogram, app, storage
+
+MIXES = {
+    "shopper": {"browse": 50, "search": 20, "cart": 20, "checkout": 5, "seller": 5},
+    "sale": {"browse": 30, "search": 5, "cart": 30, "checkout": 35},
+    "seller": {"browse": 30, "seller": 70},
+}
+
+
+async def call(method: str, path: str, session_id: str, body=None):
+    """Run one request through the ASGI app; returns (status, body bytes)."""
+    path, _, query = path.partition("?")
+    payload = b"" if body is None else json.dumps(body).encode()
+    headers = [(b"host", b"bench"), (b"x-session-id", session_id.encode())]
+    if body is not None:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await asyncio.Future()  # the client never disconnects
+
+    status = 0
+    chunks = []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+class Scenarios:
+    def __init__(self, rng: random.Random, product_ids, sellers, categories):
+        self.rng = rng
+        self.product_ids = product_ids
+        self.sellers = sellers
+        self.categories = categories
+
+    def browse(self, session_id):
+        product_id = self.rng.choice(self.product_ids)
+        return [
+            ("GET /api/categories", "GET", "/api/categories", None),
+            ("GET /api/products?category", "GET", f"/api/products?category={self.rng.choice(self.categories)}&limit=24", None),
+            ("GET /api/products/{id}", "GET", f"/api/products/{product_id}", None),
+        ]
+
+    def search(self, session_id):
+        query = self.rng.choice(QUERIES).replace(" ", "+")
+        return [("GET /api/products?search", "GET", f"/api/products?search={query}&limit=24", None)]
+
+    def cart(self, session_id):
+        line = {"productId": self.rng.choice(self.product_ids), "quantity": 1}
+        return [
+            ("POST /api/cart", "POST", "/api/cart", line),
+            ("GET /api/cart", "GET", "/api/cart?summary=true", None),
+        ]
+
+    def checkout(self, session_id):
+        line = {"productId": self.rng.choice(self.product_ids), "quantity": 1}
+        buyer = {"buyerName": "Load Test", "buyerEmail": "load@example.com"}
+        return [
+            ("POST /api/cart", "POST", "/api/cart", line),
+            ("POST /api/checkout", "POST", "/api/checkout", buyer),
+        ]
+
+    def seller(self, session_id):
+        seller_id = self.rng.choice(self.sellers)
+        return [
+            ("GET /api/seller/products", "GET", f"/api/seller/products?seller_id={seller_id}&cursor=", None),
+            ("GET /api/seller/orders", "GET", f"/api/seller/orders?seller_id={seller_id}&cursor=", None),
+            ("GET /api/seller/stats", "GET", f"/api/seller/stats?seller_id={seller_id}", None),
+        ]
+
+
+def parse_mix(spec: str) -> dict:
+    if spec in MIXES:
+        return MIXES[spec]
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(Scenarios, name):
+            raise SystemExit(f"unknown scenario {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def user(n: int, scenarios: Scenarios, mix: dict, deadline: float, stats: dict):
+    session_id = f"load-{n}"
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    rng = random.Random(n)
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        for label, method, path, body in getattr(scenarios, scenario)(session_id):
+            start = time.perf_counter()
+            status, _ = await call(method, path, session_id, body)
+            elapsed = time.perf_counter() - start
+            entry = stats.get(label)
+            if entry is None:
+                entry = stats[label] = {"latency": Histogram(1e-6, 25), "statuses": {}}
+            entry["latency"].observe(elapsed)
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+
+
+async def run(mix: dict, users: int, duration: float, scenarios: Scenarios) -> dict:
+    stats = {}
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(user(n, scenarios, mix, deadline, stats) for n in range(users)))
+    return stats, time.perf_counter() - start
+
+
+PAGE_BOUNDS = [
+    "/api/products?limit=-1",
+    "/api/products?limit=-1&cursor=",
+    "/api/products?offset=-5",
+    "/api/products?limit=100000",
+    "/api/products/prod-1/reviews?limit=-1",
+    "/api/products/prod-1/related?limit=0",
+    "/api/review?limit=-1",
+    "/api/seller/orders?limit=-1&cursor=",
+    "/api/seller/products?limit=-1&cursor=",
+]
+
+
+def check_page_bounds() -> bool:
+    problems = []
+    for path in PAGE_BOUNDS:
+        status, _ = asyncio.run(call("GET", path, "bounds"))
+        if status != 422:
+            problems.append(f"GET {path} answered {status}")
+    print(f"page bounds: {'ok' if not problems else 'FAILED'}")
+    for problem in problems:
+        print(f"    {problem}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", default="shopper")
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if not check_page_bounds():
+        return 1
+    populate(storage, args.products)
+    products = storage.get_products()
+    for product in products:
+        if product["status"] == "active":
+            storage.update_product(product["id"], {"stock": 10**9})
+    scenarios = Scenarios(
+        random.Random(0),
+        [p["id"] for p in products if p["status"] == "active"],
+        sorted({p["sellerId"] for p in products}),
+        sorted({p["categoryId"] for p in products}),
+    )
+
+    stats, elapsed = asyncio.run(run(mix, args.users, args.duration, scenarios))
+    total = sum(e["latency"].count for e in stats.values())
+    print(f"mix={args.mix} users={args.users} {total} requests in {elapsed:.1f}s = {total / elapsed:.0f} req/s")
+    print(f"{'request':<28} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    results = [{"name": "total", "requests_per_sec": round(total / elapsed, 1)}]
+    for label, entry in sorted(stats.items()):
+        latency = entry["latency"]
+        errors = sum(n for status, n in entry["statuses"].items() if status >= 500)
+        row = {
+            "name": label,
+            "count": latency.count,
+            "requests_per_sec": round(latency.count / elapsed, 1),
+            "p50_ms": round(latency.quantile(0.5) * 1e3, 3),
+            "p95_ms": round(latency.quantile(0.95) * 1e3, 3),
+            "p99_ms": round(latency.quantile(0.99) * 1e3, 3),
+            "errors": errors,
+            "statuses": {str(k): v for k, v in sorted(entry["statuses"].items())},
+        }
+        results.append(row)
+        print(
+            f"{label:<28} {row['count']:>7} {row['requests_per_sec']:>8.0f} {row['p50_ms']:>8.2f} "
+            f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {errors:>7}"
+        )
+    if args.json:
+        write_results(args.json, f"load:{args.mix}", results)
+    return 1 if any(r.get("errors") for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Measure how request throughput scales with the number of uvicorn workers.
+
+Starts ``server/main.py --workers N`` for each N, then drives it from
+several client processes over keep-alive HTTP/1.1 connections.
+
+Usage: python benchmarks/load_test.py [--workers 1 2 4] [--duration 10]
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(ROOT, "server", "main.py")
+
+SCENARIOS = {
+    "products": ("GET", "/api/products?category=cat-2", None),
+    "cart": ("POST", "/api/cart", {"productId": "prod-1", "quantity": 1}),
+}
+
+
+def wait_ready(port: int, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/categories")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def client(args):
+    port, scenario, duration, client_id = args
+    method, path, body = SCENARIOS[scenario]
+    headers = {"X-Session-ID": f"load-{client_id}", "Content-Type": "application/json"}
+    payload = json.dumps(body) if body is not None else None
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    done = errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            done += 1
+        else:
+            errors += 1
+    return done, errors
+
+
+def run(workers: int, scenario: str, clients: int, duration: float, port: int) -> dict:
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "--workers", str(workers), "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(port)
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(
+                client, [(port, scenario, duration, n) for n in range(clients)]
+            )
+    finally:
+        proc.terminate()
+        proc.wait()
+    done = sum(r[0] for r in results)
+    return {
+        "workers": workers,
+        "scenario": scenario,
+        "clients": clients,
+        "rps": done / duration,
+        "errors": sum(r[1] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--scenario", nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<10} {'workers':>7} {'clients':>7} {'req/s':>10} {'errors':>7}")
+    for scenario in args.scenario:
+        for workers in args.workers:
+            r = run(workers, scenario, args.clients, args.duration, args.port)
+            print(
+                f"{r['scenario']:<10} {r['workers']:>7} {r['clients']:>7} "
+                f"{r['rps']:>10.0f} {r['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
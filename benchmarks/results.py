@@ -0,0 +1,45 @@
+"""Machine-readable benchmark results.
+
+Every suite writes the same envelope so runs from different commits can
+be compared with ``compare.py``::
+
+    {"suite": ..., "meta": {"commit", "python", "platform", "time"},
+     "results": [{"name": ..., <numeric fields>}, ...]}
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(path: str, suite: str, results: list):
+    payload = {
+        "suite": suite,
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+        f.write("\n")
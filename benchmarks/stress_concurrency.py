@@ -0,0 +1,151 @@
+"""Concurrent cart and order writers against one Storage, checked for
+lost updates afterwards.
+
+Every thread adds to carts of its own sessions and to one session shared
+by all threads, reprices products and places orders. Afterwards each
+(session, product) must have exactly one cart line whose quantity is the
+sum of all adds, cart summaries must match a recompute at current prices,
+and seller stats must match their full recompute. With --durable the run
+journals to a temp dir with frequent snapshots, and the reopened store
+must hold the same carts.
+
+Usage: python benchmarks/stress_concurrency.py [OPS_PER_THREAD] [THREADS ...] [--durable]
+"""
+
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import synthetic  # noqa: F401  (puts the repo root on sys.path)
+
+from server.main import Storage, format_cents
+
+PRODUCTS = [f"prod-{i}" for i in range(1, 9)]
+SHARED_SESSION = "stress-shared"
+ORDER = {
+    "sellerId": "seller-1",
+    "buyerName": "Stress Buyer",
+    "buyerEmail": "stress@example.com",
+    "total": "10.00",
+    "status": "pending",
+}
+
+
+def writer(storage: Storage, thread: int, ops: int, expected: Counter, orders: list):
+    rng = random.Random(thread)
+    sessions = [f"stress-{thread}-{k}" for k in range(4)] + [SHARED_SESSION]
+    added = Counter()
+    placed = 0
+    for _ in range(ops):
+        roll = rng.random()
+        if roll < 0.85:
+            session = rng.choice(sessions)
+            product = rng.choice(PRODUCTS)
+            quantity = rng.randint(1, 3)
+            storage.add_to_cart(
+                {"sessionId": session, "productId": product, "quantity": quantity}
+            )
+            added[session, product] += quantity
+        elif roll < 0.95:
+            price = format_cents(rng.randint(100, 50_000))
+            storage.update_product(rng.choice(PRODUCTS), {"price": price})
+        else:
+            storage.create_order(ORDER)
+            placed += 1
+    expected.update(added)
+    orders.append(placed)
+
+
+def verify(storage: Storage, expected: Counter) -> list:
+    problems = []
+    sessions = {session for session, _ in expected}
+    for session in sessions:
+        lines = Counter()
+        subtotal = 0
+        for item in storage.get_cart_items(session):
+            lines[item["productId"]] += 1
+            if item["quantity"] != expected[session, item["productId"]]:
+                problems.append(
+                    f"{session}/{item['productId']}: quantity {item['quantity']}, "
+                    f"expected {expected[session, item['productId']]}"
+                )
+            subtotal += item["quantity"] * storage.products[item["productId"]].price_cents
+        problems.extend(
+            f"{session}/{pid}: {n} lines" for pid, n in lines.items() if n != 1
+        )
+        summary = storage.get_cart_summary(session)
+        if summary["subtotal"] != format_cents(subtotal):
+            problems.append(
+                f"{session}: summary subtotal {summary['subtotal']}, "
+                f"recomputed {format_cents(subtotal)}"
+            )
+    for seller_id in {p.sellerId for p in storage.products.values()}:
+        if not storage.check_seller_stats(seller_id)["consistent"]:
+            problems.append(f"{seller_id}: seller stats drifted")
+    return problems
+
+
+def cart_state(storage: Storage, sessions) -> dict:
+    return {
+        session: sorted((i["productId"], i["quantity"]) for i in storage.get_cart_items(session))
+        for session in sessions
+    }
+
+
+def run(threads: int, ops: int, durable: bool) -> bool:
+    data_dir = tempfile.mkdtemp() if durable else None
+    try:
+        storage = Storage(data_dir, fsync=False, snapshot_every=500)
+        expected = Counter()
+        orders = []
+        workers = [
+            threading.Thread(target=writer, args=(storage, t, ops, expected, orders))
+            for t in range(threads)
+        ]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+
+        problems = verify(storage, expected)
+        if len(storage.orders) != sum(orders):
+            problems.append(f"{len(storage.orders)} orders stored, {sum(orders)} placed")
+        if durable:
+            sessions = {session for session, _ in expected}
+            before = cart_state(storage, sessions)
+            storage.close()
+            storage = Storage(data_dir, fsync=False)
+            if cart_state(storage, sessions) != before:
+                problems.append("recovered carts differ from the live store")
+            storage.close()
+
+        print(
+            f"{threads:>7} {threads * ops:>8} {threads * ops / elapsed:>10.0f} "
+            f"{'ok' if not problems else 'FAILED'}"
+        )
+        for problem in problems[:10]:
+            print(f"    {problem}")
+        return not problems
+    finally:
+        if data_dir:
+            shutil.rmtree(data_dir)
+
+
+def main(argv):
+    durable = "--durable" in argv
+    args = [int(a) for a in argv if a != "--durable"]
+    ops = args[0] if args else 20_000
+    thread_counts = args[1:] or [1, 2, 4, 8, 16]
+    print(f"{'threads':>7} {'ops':>8} {'ops/s':>10} result")
+    ok = all([run(threads, ops, durable) for threads in thread_counts])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
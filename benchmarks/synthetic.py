@@ -0,0 +1,129 @@
+"""Synthetic catalog data for benchmarks.
+
+Generates product payloads shaped like ``CreateProductRequest`` with a
+skewed vocabulary so that search terms have realistic document
+frequencies.
+"""
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CATEGORIES = [
+    ("cat-1", "Fashion & Accessories"),
+    ("cat-2", "Home & Living"),
+    ("cat-3", "Electronics & Tech"),
+]
+
+ADJECTIVES = [
+    "premium", "wireless", "handcrafted", "organic", "vintage", "modern",
+    "portable", "ceramic", "leather", "stainless", "bamboo", "minimalist",
+    "rustic", "ergonomic", "waterproof", "artisanal", "compact", "luxury",
+]
+NOUNS = [
+    "speaker", "headphones", "keyboard", "vase", "candle", "bottle", "bag",
+    "wallet", "lamp", "mug", "blanket", "charger", "backpack", "watch",
+    "notebook", "planter", "scarf", "rug", "mouse", "tray",
+]
+FILLER = [
+    "perfect", "for", "daily", "use", "with", "durable", "design", "and",
+    "premium", "finish", "comfortable", "battery", "life", "natural",
+    "materials", "gift", "home", "office", "travel", "quality", "sound",
+    "soft", "cotton", "glass", "steel", "wood", "hand", "made", "eco",
+    "friendly", "adjustable", "strap", "colour", "options", "warranty",
+]
+
+QUERIES = [
+    "premium",
+    "wireless speaker",
+    "hand",
+    "leather bag",
+    "eco friendly bottle",
+    "st",
+    "vintage lamp",
+    "nothingmatches",
+]
+
+
+def make_product(rng: random.Random, n: int) -> dict:
+    category_id, category_name = rng.choice(CATEGORIES)
+    seller = rng.randrange(max(1, n // 50))
+    name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()} {n}"
+    description = " ".join(rng.choices(FILLER, k=rng.randint(12, 30)))
+    return {
+        "name": name,
+        "description": description,
+        "price": f"{rng.uniform(5, 500):.2f}",
+        "categoryId": category_id,
+        "categoryName": category_name,
+        "image": f"https://example.com/img/{n}.jpg",
+        "images": [f"https://example.com/img/{n}-{i}.jpg" for i in range(2)],
+        "sellerId": f"seller-{seller}",
+        "sellerName": f"Seller {seller}",
+        "stock": rng.randint(0, 200),
+        "status": "active" if rng.random() < 0.9 else "draft",
+        # Not part of CreateProductRequest; Storage.create_product keeps them.
+        "rating": f"{rng.triangular(1, 5, 4.4):.1f}",
+        "reviewCount": int(rng.paretovariate(1.2)) - 1,
+    }
+
+
+def make_products(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for n in range(count):
+        yield make_product(rng, n)
+
+
+def populate(storage, count: int, seed: int = 0):
+    for product in make_products(count, seed):
+        storage.create_product(product)
+    return storage
+
+
+def populate_activity(storage, product_ids, sessions: int, orders: int, seed: int = 0):
+    """Fill carts and order history on top of a populated catalog.
+
+    Each session gets 1-6 cart lines; orders are spread across the sellers
+    of ``product_ids`` so per-seller dashboards have history to page.
+    Returns the session ids.
+    """
+    rng = random.Random(seed)
+    session_ids = [f"session-{n}" for n in range(sessions)]
+    for session_id in session_ids:
+        for product_id in rng.sample(product_ids, k=min(len(product_ids), rng.randint(1, 6))):
+            storage.add_to_cart(
+                {"sessionId": session_id, "productId": product_id, "quantity": rng.randint(1, 3)}
+            )
+    sellers = sorted({storage.get_product(pid)["sellerId"] for pid in product_ids})
+    storage.create_orders(
+        [
+            {
+                "sellerId": rng.choice(sellers),
+                "buyerName": f"Buyer {n}",
+                "buyerEmail": f"buyer{n}@example.com",
+                "total": f"{rng.uniform(5, 900):.2f}",
+                "status": rng.choice(["pending", "shipped", "delivered"]),
+            }
+            for n in range(orders)
+        ]
+    )
+    return session_ids
+
+
+def populate_reviews(storage, product_ids, count: int, seed: int = 0):
+    """Add ``count`` reviews, most of them on a few popular products."""
+    rng = random.Random(seed)
+    for n in range(count):
+        product_id = product_ids[min(len(product_ids) - 1, int(rng.paretovariate(1.2)) - 1)]
+        storage.add_review(
+            product_id,
+            {
+                "rating": min(5, max(1, round(rng.triangular(1, 5, 4.4)))),
+                "quote": " ".join(rng.choices(FILLER, k=rng.randint(0, 20))),
+                "name": f"Reviewer {n}",
+            },
+        )
@@ -0,0 +1,67 @@
+"""Parsing and validating product feed rows for bulk import.
+
+Kept apart from main.py, and free of side effects on import, so that the
+process pool import_feed validates in can load it without opening the
+storage or starting any threads.
+"""
+
+from pydantic import ValidationError
+import csv
+import json
+
+try:
+    from server.models import ImportProductRequest
+except ImportError:  # run as a script from server/
+    from models import ImportProductRequest
+
+
+def read_feed(lines, feed_format: str):
+    """Yield the rows of an NDJSON or CSV product feed as dicts, or as an
+    error message for a row that cannot be parsed.
+
+    CSV rows use the column names of the API fields. Empty cells are
+    left out, and ``images`` is a JSON array or a "|"-separated list.
+    """
+    if feed_format == "csv":
+        for row in csv.DictReader(lines):
+            data = {k: v for k, v in row.items() if k is not None and v != ""}
+            images = data.get("images")
+            if images is not None:
+                if images.startswith("["):
+                    try:
+                        data["images"] = json.loads(images)
+                    except ValueError:
+                        yield "images is not a JSON array"
+                        continue
+                else:
+                    data["images"] = images.split("|")
+            yield data
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield f"Invalid JSON: {exc}"
+            continue
+        yield row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def validate_product_rows(rows: list) -> list:
+    """(payload, None) or (None, error) for each feed row. Module-level so
+    that a process pool can run it."""
+    results = []
+    for row in rows:
+        if isinstance(row, str):
+            results.append((None, row))
+            continue
+        try:
+            payload = ImportProductRequest.model_validate(row).model_dump()
+        except ValidationError as exc:
+            results.append((None, exc.errors(include_url=False, include_context=False)))
+            continue
+        if payload["id"] is None:
+            del payload["id"]
+        results.append((payload, None))
+    return results
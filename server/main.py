@@ -1,116 +1,1244 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from pydantic import ValidationError
 from typing import Optional, List
-from uuid import uuid4
-from datetime import datetime
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from bisect import bisect_left, bisect_right, insort
+from itertools import count, islice
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from multiprocessing.managers import BaseManager
+from starlette.concurrency import run_in_threadpool
+import argparse
+import asyncio
+import base64
+import csv
+import functools
+import gc
+import gzip
+import hashlib
+import heapq
+import io
 import json
+import math
+import multiprocessing
+import operator
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
 
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip is offered
+    brotli = None
 
-# Data Models
-class Category(BaseModel):
-    id: str
-    name: str
-    slug: str
-    image: str
-
-
-class Product(BaseModel):
-    id: str
-    name: str
-    description: str
-    price: str
-    categoryId: str
-    categoryName: str
-    image: str
-    images: List[str]
-    sellerId: str
-    sellerName: str
-    stock: int
-    status: str
-    rating: str
-    reviewCount: int
-
-
-class CartItem(BaseModel):
-    id: str
-    sessionId: str
-    productId: str
-    quantity: int
-
-
-class Order(BaseModel):
-    id: str
-    sellerId: str
-    buyerName: str
-    buyerEmail: str
-    total: str
-    status: str
-    createdAt: datetime
-
-
-class SellerStats(BaseModel):
-    revenue: float
-    activeListings: int
-    totalOrders: int
-    avgOrderValue: float
-
-
-# Request Models
-class CreateProductRequest(BaseModel):
-    name: str
-    description: str
-    price: str
-    categoryId: str
-    categoryName: str
-    image: str
-    images: List[str]
-    sellerId: str
-    sellerName: str
-    stock: int
-    status: str
-
-
-class UpdateProductRequest(BaseModel):
-    name: Optional[str] = None
-    description: Optional[str] = None
-    price: Optional[str] = None
-    categoryId: Optional[str] = None
-    categoryName: Optional[str] = None
-    image: Optional[str] = None
-    images: Optional[List[str]] = None
-    sellerId: Optional[str] = None
-    sellerName: Optional[str] = None
-    stock: Optional[int] = None
-    status: Optional[str] = None
-
-
-class AddToCartRequest(BaseModel):
-    productId: str
-    quantity: int
-
-
-class UpdateCartItemRequest(BaseModel):
-    quantity: int
-
-
-class CreateOrderRequest(BaseModel):
-    sellerId: str
-    buyerName: str
-    buyerEmail: str
-    total: str
-    status: str
+
+try:
+    from server.feed import read_feed, validate_product_rows
+    from server.models import (
+        AddToCartRequest,
+        CartChangeRequest,
+        CheckoutRequest,
+        CreateOrderRequest,
+        CreateProductRequest,
+        CreateReviewRequest,
+        UpdateCartItemRequest,
+        UpdateProductRequest,
+    )
+except ImportError:  # run as a script from server/
+    from feed import read_feed, validate_product_rows
+    from models import (
+        AddToCartRequest,
+        CartChangeRequest,
+        CheckoutRequest,
+        CreateOrderRequest,
+        CreateProductRequest,
+        CreateReviewRequest,
+        UpdateCartItemRequest,
+        UpdateProductRequest,
+    )
+
+
+# Compact product records
+def format_cents(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    cents = abs(cents)
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+
+class ProductRecord:
+    """Slotted in-memory product.
+
+    Money and rating are held as integers (cents, tenths of a star), the
+    repeated id/name/status strings are interned and ``images`` is a
+    tuple. Item access and ``to_dict`` give back the API's JSON shape, with
+    ``price`` and ``rating`` as strings.
+    """
+
+    FIELDS = (
+        "id",
+        "name",
+        "description",
+        "price",
+        "categoryId",
+        "categoryName",
+        "image",
+        "images",
+        "sellerId",
+        "sellerName",
+        "stock",
+        "status",
+        "rating",
+        "reviewCount",
+    )
+    _FIELD_SET = frozenset(FIELDS)
+    _INTERNED = frozenset(("categoryId", "categoryName", "sellerId", "sellerName", "status"))
+
+    __slots__ = (
+        "id",
+        "name",
+        "description",
+        "price_cents",
+        "categoryId",
+        "categoryName",
+        "image",
+        "images",
+        "sellerId",
+        "sellerName",
+        "stock",
+        "status",
+        "rating_tenths",
+        "reviewCount",
+        "_json",
+    )
+
+    _STATE = __slots__[:-1]  # everything but the cached JSON
+    _get_state = operator.attrgetter(*_STATE)
+
+    def __init__(self, data: dict):
+        self._json = None
+        self.update(data)
+
+    @property
+    def price(self) -> str:
+        return format_cents(self.price_cents)
+
+    @price.setter
+    def price(self, value):
+        self.price_cents = to_cents(value)
+
+    @property
+    def rating(self) -> str:
+        return f"{self.rating_tenths // 10}.{self.rating_tenths % 10}"
+
+    @rating.setter
+    def rating(self, value):
+        self.rating_tenths = to_tenths(value)
+
+    def __getitem__(self, key: str):
+        if key not in self._FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self._FIELD_SET else default
+
+    def update(self, updates: dict):
+        """Apply API-shaped field updates; unknown keys are ignored."""
+        for key, value in updates.items():
+            if key not in self._FIELD_SET:
+                continue
+            if key in self._INTERNED:
+                value = sys.intern(value)
+            elif key == "images":
+                value = tuple(value)
+            setattr(self, key, value)
+        self._json = None
+
+    def to_dict(self) -> dict:
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data["images"] = list(self.images)
+        return data
+
+    def state(self) -> tuple:
+        """The record's fields as they are now: cheap enough to take under
+        a lock, and turned back into a record by ``from_state``."""
+        return self._get_state(self)
+
+    @classmethod
+    def from_state(cls, state: tuple) -> "ProductRecord":
+        record = cls.__new__(cls)
+        for slot, value in zip(cls._STATE, state):
+            setattr(record, slot, value)
+        record._json = None
+        return record
+
+    def json(self) -> bytes:
+        """Encoded JSON, cached until the next update."""
+        if self._json is None:
+            self._json = encode_json(self.to_dict())
+        return self._json
+
+
+# Full-text search
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """Inverted index over product names and descriptions.
+
+    Every query token is treated as a prefix, a product must match all of
+    them, and matches are ranked by a tf-idf style score in which name
+    hits weigh more than description hits.
+    """
+
+    NAME_WEIGHT = 3.0
+    DESCRIPTION_WEIGHT = 1.0
+
+    def __init__(self):
+        self._postings = {}  # term -> {product_id: weight}
+        self._terms = []  # sorted vocabulary, used for prefix expansion
+        self._doc_terms = {}  # product_id -> terms it was indexed under
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def add(self, product_id: str, name: str, description: str):
+        self.add_many(((product_id, name, description),))
+
+    def add_many(self, documents):
+        """Index (product_id, name, description) triples. New vocabulary
+        terms are merged into the sorted term list once, at the end."""
+        new_terms = []
+        for product_id, name, description in documents:
+            weights = {}
+            for term in tokenize(name):
+                weights[term] = weights.get(term, 0.0) + self.NAME_WEIGHT
+            for term in tokenize(description):
+                weights[term] = weights.get(term, 0.0) + self.DESCRIPTION_WEIGHT
+
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    new_terms.append(term)
+                postings[product_id] = weight
+            self._doc_terms[product_id] = tuple(weights)
+
+        if len(new_terms) == 1:
+            insort(self._terms, new_terms[0])
+        elif new_terms:
+            # Two sorted runs: list.sort merges them in linear time.
+            new_terms.sort()
+            self._terms += new_terms
+            self._terms.sort()
+
+    def remove(self, product_id: str):
+        for term in self._doc_terms.pop(product_id, ()):
+            postings = self._postings[term]
+            del postings[product_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def _expand(self, prefix: str):
+        terms = self._terms
+        for i in range(bisect_left(terms, prefix), len(terms)):
+            if not terms[i].startswith(prefix):
+                break
+            yield terms[i]
+
+    def search(self, query: str) -> dict:
+        """Return {product_id: score} for products matching every query token."""
+        tokens = tokenize(query)
+        if not tokens:
+            return {}
+
+        total_docs = len(self._doc_terms)
+        expanded = []
+        for token in dict.fromkeys(tokens):
+            terms = []
+            for term in self._expand(token):
+                postings = self._postings[term]
+                idf = math.log(1 + total_docs / len(postings))
+                # Exact term hits rank above hits on longer completions.
+                boost = idf if term == token else idf * 0.5
+                terms.append((postings, boost))
+            if not terms:
+                return {}
+            expanded.append((sum(len(p) for p, _ in terms), terms))
+
+        # Start from the rarest token; later tokens either probe the
+        # surviving candidates or are scanned, whichever touches less.
+        expanded.sort(key=lambda entry: entry[0])
+        result = None
+        for size, terms in expanded:
+            if result is not None and len(result) * len(terms) < size:
+                scores = {}
+                for pid in result:
+                    best = 0.0
+                    for postings, boost in terms:
+                        weight = postings.get(pid)
+                        if weight is not None and weight * boost > best:
+                            best = weight * boost
+                    if best:
+                        scores[pid] = best
+            elif len(terms) == 1:
+                postings, boost = terms[0]
+                scores = {pid: weight * boost for pid, weight in postings.items()}
+            else:
+                scores = {}
+                for postings, boost in terms:
+                    for pid, weight in postings.items():
+                        score = weight * boost
+                        if score > scores.get(pid, 0.0):
+                            scores[pid] = score
+            if result is None:
+                result = scores
+            else:
+                result = {
+                    pid: score + scores[pid]
+                    for pid, score in result.items()
+                    if pid in scores
+                }
+            if not result:
+                return {}
+        return result
+
+
+# Ordered indexes and cursors
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def page_size(limit: Optional[int]) -> int:
+    """``limit`` clamped to 1..MAX_PAGE_SIZE; DEFAULT_PAGE_SIZE if unset."""
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+class OrderedIndex:
+    """Sorted list of (key, record_id) entries.
+
+    Inserts and removals are a bisect plus a list shift, and iteration can
+    resume just after any entry, which is what cursor pagination needs.
+    """
+
+    def __init__(self):
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, record_id: str):
+        entry = (key, record_id)
+        entries = self._entries
+        if not entries or entries[-1] < entry:
+            entries.append(entry)
+        else:
+            insort(entries, entry)
+
+    def discard(self, key, record_id: str):
+        entry = (key, record_id)
+        entries = self._entries
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    # Below this many entries, per-entry insort/del beats rebuilding the list.
+    BULK_THRESHOLD = 16
+
+    def add_many(self, entries):
+        """Add several entries with one pass over the list instead of one
+        insert (a shift of everything after it) per entry."""
+        if len(entries) < self.BULK_THRESHOLD:
+            for key, record_id in entries:
+                self.add(key, record_id)
+            return
+        new = sorted(entries)
+        old = self._entries
+        if not old or old[-1] < new[0]:
+            old.extend(new)
+            return
+        merged = []
+        start = 0
+        for entry in new:
+            i = bisect_left(old, entry, start)
+            merged.extend(old[start:i])
+            merged.append(entry)
+            start = i
+        merged.extend(old[start:])
+        self._entries = merged
+
+    def discard_many(self, entries):
+        """Remove several entries (missing ones are ignored) in one pass."""
+        if len(entries) < self.BULK_THRESHOLD:
+            for key, record_id in entries:
+                self.discard(key, record_id)
+            return
+        old = self._entries
+        kept = []
+        start = 0
+        for entry in sorted(entries):
+            i = bisect_left(old, entry, start)
+            if i < len(old) and old[i] == entry:
+                kept.extend(old[start:i])
+                start = i + 1
+        kept.extend(old[start:])
+        self._entries = kept
+
+    @classmethod
+    def from_entries(cls, entries):
+        index = cls()
+        index._entries = sorted(entries)
+        return index
+
+    def span(self, low: Optional[int] = None, high: Optional[int] = None):
+        """(start, stop) positions of the entries with ``low <= key <= high``.
+        Only for integer keys."""
+        entries = self._entries
+        start = 0 if low is None else bisect_left(entries, (low,))
+        stop = len(entries) if high is None else bisect_left(entries, (high + 1,))
+        return start, max(start, stop)
+
+    def key_span(self, low=None, high=None):
+        """(start, stop) positions of the entries with ``low <= key < high``."""
+        entries = self._entries
+        start = 0 if low is None else bisect_left(entries, (low,))
+        stop = len(entries) if high is None else bisect_left(entries, (high,))
+        return start, max(start, stop)
+
+    def iter_span(
+        self, start: int, stop: int, after: Optional[tuple] = None, reverse: bool = False
+    ):
+        """Yield ``entries[start:stop]`` strictly after ``after`` in iteration order."""
+        entries = self._entries
+        if reverse:
+            if after is not None:
+                stop = min(stop, bisect_left(entries, after))
+            for i in range(stop - 1, start - 1, -1):
+                yield entries[i]
+        else:
+            if after is not None:
+                start = max(start, bisect_right(entries, after))
+            for i in range(start, stop):
+                yield entries[i]
+
+    def iter_from(self, after: Optional[tuple] = None, reverse: bool = False):
+        """Yield entries strictly after ``after`` in iteration order."""
+        return self.iter_span(0, len(self._entries), after, reverse)
+
+    def ids(self, start: int, stop: int) -> list:
+        return [entry[1] for entry in self._entries[start:stop]]
+
+
+def encode_cursor(entry: tuple) -> str:
+    raw = json.dumps(entry, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, record_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, (int, str)) or not isinstance(record_id, str):
+        raise ValueError("Invalid cursor")
+    return (key, record_id)
+
+
+def to_tenths(value) -> int:
+    """Parse a rating such as "4.5" into integer tenths of a star."""
+    try:
+        tenths = Decimal(str(value)) * 10
+    except InvalidOperation:
+        raise ValueError(f"Invalid rating: {value!r}")
+    if not tenths.is_finite():
+        raise ValueError(f"Invalid rating: {value!r}")
+    return int(tenths.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_timestamp(value) -> str:
+    """Parse an ISO date or datetime into the naive local isoformat that
+    order ``createdAt`` values use, so the two compare as strings."""
+    try:
+        moment = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+
+def encode_json(content) -> bytes:
+    # Same encoding FastAPI's JSONResponse uses.
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def json_array(fragments) -> bytes:
+    """Join pre-encoded JSON values into a JSON array."""
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def new_ids(count: int) -> List[str]:
+    """``count`` random UUID4 strings from a single urandom call."""
+    raw = os.urandom(16 * count)
+    return [str(UUID(bytes=raw[i : i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
+
+def to_cents(amount) -> int:
+    """Parse a decimal money string such as "129.99" into integer cents."""
+    try:
+        value = Decimal(str(amount))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {amount!r}")
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount: {amount!r}")
+    return int((value * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+# Durability
+def fsync_dir(path: str):
+    """Make a rename or replace inside ``path`` durable."""
+    dir_fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class Journal:
+    """Append-only JSON-lines redo log with group commit.
+
+    ``append`` only buffers the encoded record. A background thread writes
+    whatever has accumulated and covers it with a single fsync, so
+    concurrent writers waiting in ``wait`` share one fsync per batch
+    instead of paying one each.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self._fsync = fsync
+        self._file = open(path, "ab")
+        lock = threading.Lock()
+        self._pending = threading.Condition(lock)  # wakes the flusher
+        self._flushed = threading.Condition(lock)  # wakes waiting writers
+        self._buffer = []
+        self._size = os.fstat(self._file.fileno()).st_size  # bytes, buffered included
+        self._appended = 0  # sequence number of the last appended record
+        self._durable = 0  # sequence number of the last fsynced record
+        self._closed = False
+        self.records = 0  # records since the last truncate
+        self.batches = 0
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="journal-flush", daemon=True
+        )
+        self._thread.start()
+
+    def append(self, record: dict) -> int:
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._pending:
+            if self._closed:
+                raise RuntimeError("Journal is closed")
+            self._buffer.append(line)
+            self._size += len(line)
+            self._appended += 1
+            self.records += 1
+            self._pending.notify()
+            return self._appended
+
+    def wait(self, seq: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """Block until record ``seq`` (default: everything appended) is durable."""
+        with self._flushed:
+            target = self._appended if seq is None else seq
+            return self._flushed.wait_for(lambda: self._durable >= target, timeout)
+
+    def _flush_loop(self):
+        while True:
+            with self._pending:
+                self._pending.wait_for(lambda: self._buffer or self._closed)
+                if not self._buffer:
+                    return
+                batch, self._buffer = self._buffer, []
+                seq = self._appended
+
+            self._file.write(b"".join(batch))
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+
+            with self._flushed:
+                self._durable = seq
+                self.batches += 1
+                self._flushed.notify_all()
+
+    @property
+    def size(self) -> int:
+        """Bytes in the journal, including what is not yet written."""
+        return self._size
+
+    def mark(self) -> int:
+        """Offset just past the last appended record, for ``truncate``."""
+        with self._pending:
+            return self._size
+
+    def truncate(self, upto: Optional[int] = None):
+        """Drop the records before offset ``upto`` (default: all of them)
+        once they are durable (after a snapshot that covers them). Records
+        appended since are kept."""
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._durable >= self._appended)
+            # Holding the lock with an empty buffer keeps both appenders and
+            # the flusher out while the file is cut.
+            if upto is None or upto >= self._size:
+                upto, tail = self._size, b""
+                self._file.truncate(0)
+                self._file.flush()
+                if self._fsync:
+                    os.fsync(self._file.fileno())
+            else:
+                with open(self.path, "rb") as f:
+                    f.seek(upto)
+                    tail = f.read()
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(tail)
+                    f.flush()
+                    if self._fsync:
+                        os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                if self._fsync:
+                    fsync_dir(os.path.dirname(self.path))
+                self._file.close()
+                self._file = open(self.path, "ab")
+            self._size -= upto
+            self.records = tail.count(b"\n")
+
+    def close(self):
+        with self._pending:
+            self._closed = True
+            self._pending.notify()
+        self._thread.join()
+        self._file.close()
+
+    @staticmethod
+    def read(path: str):
+        """Yield the records in a journal file, ignoring a torn final line."""
+        if not os.path.exists(path):
+            return
+        # Line by line: a journal of large import batches need not fit in
+        # memory twice over.
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    if not line.endswith(b"\n"):
+                        return  # partial write from a crash
+                    raise
+
+
+# Sales rollups
+SALES_INTERVALS = ("day", "week", "month")
+
+
+@functools.lru_cache(maxsize=4096)
+def bucket_starts(day: str) -> tuple:
+    """The starts of the day, week (from Monday) and month containing the
+    date "YYYY-MM-DD", as midnight timestamps in the createdAt format."""
+    moment = datetime.fromisoformat(day)
+    week = moment - timedelta(days=moment.weekday())
+    return moment.isoformat(), week.isoformat(), moment.replace(day=1).isoformat()
+
+
+class SalesRollup:
+    """Revenue, order and unit counts per day, week and month of one
+    sales series: a seller's, or one of its products'.
+
+    Each interval maps bucket starts to [revenue cents, orders, units],
+    and keeps the starts sorted, so a range is two bisects and a walk over
+    the buckets inside it, however many orders they count.
+    """
+
+    __slots__ = ("_buckets", "_starts", "_day", "_current")
+
+    def __init__(self):
+        self._buckets = tuple({} for _ in SALES_INTERVALS)
+        self._starts = tuple([] for _ in SALES_INTERVALS)
+        # Orders mostly arrive in time order, so remember the last day's
+        # buckets rather than looking them up per order.
+        self._day = None
+        self._current = ()
+
+    def add(self, created_at: str, cents: int, units: int):
+        day = created_at[:10]
+        if day != self._day:
+            self._day = day
+            self._current = tuple(
+                self._bucket(buckets, starts, start)
+                for buckets, starts, start in zip(self._buckets, self._starts, bucket_starts(day))
+            )
+        for bucket in self._current:
+            bucket[0] += cents
+            bucket[1] += 1
+            bucket[2] += units
+
+    @staticmethod
+    def _bucket(buckets: dict, starts: list, start: str) -> list:
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = [0, 0, 0]
+            if not starts or starts[-1] < start:
+                starts.append(start)
+            else:
+                insort(starts, start)
+        return bucket
+
+    def series(self, interval: str, since: Optional[str] = None, until: Optional[str] = None):
+        """(start, cents, orders, units) for the buckets that overlap
+        [since, until), oldest first."""
+        i = SALES_INTERVALS.index(interval)
+        starts = self._starts[i]
+        buckets = self._buckets[i]
+        low = bisect_left(starts, bucket_starts(since[:10])[i]) if since else 0
+        high = bisect_left(starts, until) if until else len(starts)
+        return [(start, *buckets[start]) for start in starts[low:high]]
+
+
+# Metrics
+class Histogram:
+    """Log-bucketed histogram: four buckets per doubling above ``base``.
+
+    Quantiles are interpolated inside a bucket, so they are within about
+    19% of the true value at any scale, for a fixed few hundred bytes.
+    """
+
+    STEPS = 4
+
+    def __init__(self, base: float, doublings: int):
+        self._base = base
+        self.buckets = [0] * (doublings * self.STEPS + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def _bound(self, i: int) -> float:
+        return self._base * 2 ** (i / self.STEPS)
+
+    def observe(self, value: float):
+        i = 0
+        if value > self._base:
+            i = min(
+                int(math.log2(value / self._base) * self.STEPS) + 1, len(self.buckets) - 1
+            )
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lower = self._bound(i - 1) if i else 0.0
+                return lower + (self._bound(i) - lower) * (rank - seen) / n
+            seen += n
+        return 0.0
+
+
+class Metrics:
+    """Call counts, latency and payload-size histograms per name.
+
+    Counts are exact; latency and size are recorded for every
+    ``sample_every``-th call, which keeps the cost negligible on
+    microsecond-scale calls.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, sample_every: int = 1):
+        self.sample_every = max(1, sample_every)
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._latency = {}
+        self._sizes = {}
+        self._statuses = {}
+
+    def tick(self, name: str) -> bool:
+        """Count a call; True if this one should be timed."""
+        with self._lock:
+            calls = self._calls[name] = self._calls.get(name, 0) + 1
+        return calls % self.sample_every == 0
+
+    def observe(
+        self, name: str, seconds: float, size: Optional[int] = None, status: Optional[int] = None
+    ):
+        with self._lock:
+            latency = self._latency.get(name)
+            if latency is None:
+                latency = self._latency[name] = Histogram(1e-6, 25)  # 1us .. 33s
+            latency.observe(seconds)
+            if size is not None:
+                sizes = self._sizes.get(name)
+                if sizes is None:
+                    sizes = self._sizes[name] = Histogram(1, 32)  # 1B .. 4GiB
+                sizes.observe(size)
+            if status is not None:
+                key = (name, status)
+                self._statuses[key] = self._statuses.get(key, 0) + 1
+
+    def render(self, prefix: str, label: str) -> str:
+        """Prometheus text exposition of everything recorded so far."""
+        with self._lock:
+            calls = dict(self._calls)
+            statuses = dict(self._statuses)
+            summaries = [
+                ("seconds", "Latency in seconds (sampled)", self._latency),
+                ("bytes", "Payload size in bytes (sampled)", self._sizes),
+            ]
+            lines = [
+                f"# HELP {prefix}_calls_total Calls handled.",
+                f"# TYPE {prefix}_calls_total counter",
+            ]
+            lines += [
+                f'{prefix}_calls_total{{{label}="{prom_escape(name)}"}} {n}'
+                for name, n in sorted(calls.items())
+            ]
+            for suffix, help_text, histograms in summaries:
+                metric = f"{prefix}_{suffix}"
+                lines += [f"# HELP {metric} {help_text}.", f"# TYPE {metric} summary"]
+                for name, h in sorted(histograms.items()):
+                    labels = f'{label}="{prom_escape(name)}"'
+                    lines += [
+                        f'{metric}{{{labels},quantile="{q}"}} {h.quantile(q):.9g}'
+                        for q in self.QUANTILES
+                    ]
+                    lines.append(f"{metric}_sum{{{labels}}} {h.sum:.9g}")
+                    lines.append(f"{metric}_count{{{labels}}} {h.count}")
+            if statuses:
+                lines += [
+                    f"# HELP {prefix}_responses_total Responses by status code.",
+                    f"# TYPE {prefix}_responses_total counter",
+                ]
+                lines += [
+                    f'{prefix}_responses_total{{{label}="{prom_escape(name)}",status="{code}"}} {n}'
+                    for (name, code), n in sorted(statuses.items())
+                ]
+        return "\n".join(lines) + "\n"
+
+
+def prom_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STORAGE_METRICS = Metrics(sample_every=int(os.environ.get("SHOP_METRICS_SAMPLE_EVERY", 16)))
+
+
+def instrumented(method):
+    """Count calls to a Storage method and time a sample of them."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        if not STORAGE_METRICS.tick(name):
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        result = method(self, *args, **kwargs)
+        size = len(result) if isinstance(result, bytes) else None
+        STORAGE_METRICS.observe(name, time.perf_counter() - start, size)
+        return result
+
+    return timed
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and measures its response body, labelled
+    by route template. Plain ASGI, so it adds no per-request task or
+    body buffering."""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def measured_send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, measured_send)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            name = f'{scope["method"]} {path}'
+            self.metrics.tick(name)
+            self.metrics.observe(name, time.perf_counter() - start, size, status)
+
+
+# Concurrency
+class StripedLock:
+    """A fixed pool of locks handed out by key hash.
+
+    Unrelated keys rarely share a stripe, so they proceed in parallel,
+    while memory stays constant however many sessions or products exist.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __call__(self, key) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    @contextmanager
+    def many(self, keys):
+        """Hold the stripes of several keys. Stripes are taken in a fixed
+        order, so holders of overlapping key sets cannot deadlock."""
+        stripes = sorted({hash(key) % len(self._locks) for key in keys})
+        locks = [self._locks[i] for i in stripes]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    @contextmanager
+    def all(self):
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+
+class ChangeFeed:
+    """Bounded, sequence-numbered log of change events.
+
+    Writers publish under a leaf lock. Readers ask for everything after
+    the last sequence number they saw, optionally waiting for more, and
+    are told to reset when the events they missed have been dropped.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._waiting = 0  # notify_all is not free, so skip it when no one waits
+
+    def publish(self, kind: str, key: str, topics: tuple, data):
+        """``key`` names what the event describes; a later event with the
+        same key supersedes it. ``topics`` are who should hear about it.
+        ``data`` is a dict, or a function returning one that is called
+        the first time the event is read, so unread events cost no more
+        than what the function captured."""
+        with self._lock:
+            self._seq += 1
+            self._events.append(
+                {"seq": self._seq, "type": kind, "key": key, "topics": topics, "data": data}
+            )
+            if self._waiting:
+                self._changed.notify_all()
+
+    def read(self, after: Optional[int] = None, timeout: float = 0.0) -> dict:
+        """{"events", "last", "reset"}: the events after sequence number
+        ``after`` (none if it is None), the newest sequence number, and
+        whether events after ``after`` were dropped or never existed."""
+        with self._changed:
+            if after is None:
+                return {"events": [], "last": self._seq, "reset": False}
+            if timeout and self._seq == after:
+                self._waiting += 1
+                try:
+                    self._changed.wait(timeout)
+                finally:
+                    self._waiting -= 1
+            last = self._seq
+            if after >= last:
+                return {"events": [], "last": last, "reset": after > last}
+            first = self._events[0]["seq"]
+            events = list(islice(self._events, max(0, after + 1 - first), None))
+            for event in events:
+                if callable(event["data"]):
+                    event["data"] = event["data"]()
+            return {"events": events, "last": last, "reset": after + 1 < first}
+
+
+# Related products
+RELATED_TOP_K = 12
+RELATED_CART_WEIGHT = 1  # added to a cart holding the other product
+RELATED_ORDER_WEIGHT = 3  # ordered together
+
+
+class CoOccurrence:
+    """How often products end up in the same cart or order, with each
+    product's top-K neighbours precomputed so reading them is a lookup.
+
+    Writers only queue what they saw (``record``). ``refresh`` folds the
+    queue into per-product neighbour counts and recomputes the top-K of
+    the products it touched. A product keeps at most ``counters`` counts:
+    a new neighbour of a full product takes over the smallest count plus
+    its own weight (Space-Saving), so frequent pairs survive any number of
+    rare ones. Both locks are leaves.
+    """
+
+    def __init__(
+        self, top_k: int = RELATED_TOP_K, counters: int = 4 * RELATED_TOP_K, backlog: int = 100_000
+    ):
+        self.top_k = top_k
+        self.counters = counters
+        self.dropped = 0  # queued observations lost to a full backlog
+        self._pending = deque(maxlen=backlog)
+        self._counts = {}
+        self._top = {}
+        self._lock = threading.Lock()  # the queue
+        self._refresh_lock = threading.Lock()  # the counts
+
+    def record(self, product_id: str, others: tuple, weight: int):
+        """Note that ``product_id`` was seen together with each of ``others``."""
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append((product_id, others, weight))
+
+    def neighbours(self, product_id: str) -> tuple:
+        """Up to top_k product ids, most often seen together first, as of
+        the last refresh."""
+        return self._top.get(product_id, ())
+
+    def discard(self, product_id: str):
+        """Forget a deleted product: its own counts, its place in every other
+        product's counts and top-K, and queued observations of it."""
+        with self._refresh_lock:
+            with self._lock:
+                self._pending = deque(
+                    (
+                        (other, tuple(o for o in others if o != product_id), weight)
+                        for other, others, weight in self._pending
+                        if other != product_id
+                    ),
+                    maxlen=self._pending.maxlen,
+                )
+            self._counts.pop(product_id, None)
+            self._top.pop(product_id, None)
+            # Space-Saving evictions can leave a count on one side of a
+            # pair only, so every row is checked, not just its neighbours'.
+            for other, counts in self._counts.items():
+                if counts.pop(product_id, None) is not None:
+                    self._top[other] = self._top_of(counts)
+
+    def refresh(self) -> int:
+        """Fold the queued observations in; returns how many products' top-K
+        were recomputed."""
+        with self._refresh_lock:
+            with self._lock:
+                pending = list(self._pending)
+                self._pending.clear()
+            touched = set()
+            for product_id, others, weight in pending:
+                for other in others:
+                    if other != product_id:
+                        self._bump(product_id, other, weight)
+                        self._bump(other, product_id, weight)
+                        touched.add(other)
+                touched.add(product_id)
+            for product_id in touched:
+                counts = self._counts.get(product_id)
+                if counts:
+                    self._top[product_id] = self._top_of(counts)
+            return len(touched)
+
+    def _top_of(self, counts: dict) -> tuple:
+        return tuple(heapq.nlargest(self.top_k, counts, key=counts.__getitem__))
+
+    def _bump(self, product_id: str, other: str, weight: int):
+        counts = self._counts.get(product_id)
+        if counts is None:
+            counts = self._counts[product_id] = {}
+        if other in counts:
+            counts[other] += weight
+        elif len(counts) < self.counters:
+            counts[other] = weight
+        else:
+            smallest = min(counts, key=counts.__getitem__)
+            counts[other] = counts.pop(smallest) + weight
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "products": len(self._top),
+                "pending": len(self._pending),
+                "dropped": self.dropped,
+            }
+
+
+class CheckoutError(ValueError):
+    """A cart that cannot be checked out as it stands; ``problems`` lists
+    the offending lines."""
+
+    def __init__(self, message: str, problems: List[dict]):
+        super().__init__(message, problems)
+        self.problems = problems
+
+    def __str__(self):
+        return self.args[0]
+
+
+def synchronized(method):
+    """Run a Storage method under the store-wide ``_lock``."""
+
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return locked
 
 
 # In-Memory Storage
 class Storage:
-    def __init__(self):
+    """The in-memory store. Safe to call from several threads.
+
+    Locks are always taken in this order, each level optional:
+
+    1. ``_session_locks`` stripe: a session's cart read-modify-writes.
+    2. ``_product_locks`` stripe: a product's read-modify-writes and its
+       cart-line bucket.
+    3. ``_lock``: the structures every writer shares (catalog and order
+       indexes, search, seller stats, categories, orders).
+    4. ``_summary_lock``: cart summary arithmetic and last-touched times.
+       The change feed's and related-products index's locks are leaves
+       at the same level.
+
+    Cart traffic only takes 1, 2 and 4, so carts of different sessions
+    don't wait on each other or on catalog writes.
+    """
+
+    SNAPSHOT_FILE = "snapshot.json"
+    JOURNAL_FILE = "journal.log"
+
+    def __init__(
+        self,
+        data_dir: Optional[str] = None,
+        fsync: bool = True,
+        snapshot_every: int = 50_000,
+        snapshot_bytes: int = 64 << 20,
+    ):
         self.products = {}
         self.categories = {}
         self.cart_items = {}
         self.orders = {}
+        self.reviews = {}
+
+        # Products are listed in creation order, keyed by a sequence number;
+        # orders newest first, keyed by createdAt.
+        self._product_seq = count()
+        self._product_keys = {}
+        self._product_order = OrderedIndex()
+        self._order_order = OrderedIndex()
+
+        # Listing sorts and range filters: (price cents | rating tenths |
+        # review count, product id).
+        self._products_by_price = OrderedIndex()
+        self._products_by_rating = OrderedIndex()
+        self._products_by_reviews = OrderedIndex()
+
+        # Secondary indexes: owner key -> OrderedIndex of its records, or
+        # {record id: None} for the unordered session index.
+        self._products_by_category = {}
+        self._products_by_seller = {}
+        self._orders_by_seller = {}
+        self._cart_by_session = {}
+        self._cart_lines_by_product = {}
+        # Per-session {"lines", "itemCount", "subtotalCents"}, kept current by
+        # the cart hooks and by product price changes.
+        self._cart_summaries = {}
+        # Sessions with a non-empty cart, least recently touched first.
+        self._cart_touched = OrderedDict()
+        self._cart_evictions = {"sessions": 0, "items": 0, "bytes": 0}
+        self._search = SearchIndex()
+
+        # Running per-seller aggregates behind get_seller_stats, and sales
+        # per time bucket: (seller id, None | product id) -> SalesRollup.
+        self._seller_stats = {}
+        self._sales_rollups = {}
+
+        # Reviews: product id -> OrderedIndex keyed by createdAt, each
+        # product's star total in tenths (its rating is total / reviewCount),
+        # and a min-heap of the TOP_REVIEWS best (rating, createdAt, id).
+        self._reviews_by_product = {}
+        self._rating_totals = {}
+        self._top_reviews = []
+
+        # Bumped on every catalog mutation; HTTP caches key on these.
+        self._catalog_versions = {"products": 0, "categories": 0}
+
+        # Encoded JSON of each category (products cache their own), refreshed
+        # on mutation so list responses are a join of ready-made fragments.
+        self._category_json = {}
+
+        # Durable mode: every mutation appends a redo record to the journal,
+        # and the journal is folded into a snapshot once it holds
+        # `snapshot_every` records or `snapshot_bytes` bytes, whichever
+        # comes first (a batch import writes few but very large records).
+        self._journal = None
+        self._data_dir = data_dir
+        self._snapshot_every = snapshot_every
+        self._snapshot_bytes = snapshot_bytes
+        self._snapshot_guard = threading.Lock()  # held while a snapshot runs
+
+        # Product, order and seller-stats changes, for push subscribers.
+        self._changes = ChangeFeed()
+
+        # Products carted and ordered together, behind get_related_json.
+        self._related = CoOccurrence()
+
+        self._lock = threading.RLock()
+        self._session_locks = StripedLock()
+        self._product_locks = StripedLock()
+        self._summary_lock = threading.Lock()
+
+        if data_dir and self._recover(data_dir):
+            self._journal = Journal(os.path.join(data_dir, self.JOURNAL_FILE), fsync)
+            return
+
         self._seed_data()
-        self.review = []
+        if data_dir:
+            self._journal = Journal(os.path.join(data_dir, self.JOURNAL_FILE), fsync)
+            self.snapshot()
 
     def _seed_data(self):
         # Categories
@@ -135,7 +1263,7 @@ class Storage:
             },
         ]
         for cat in categories_data:
-            self.categories[cat["id"]] = cat
+            self._store_category(cat)
 
         # Products
         products_data = [
@@ -293,186 +1421,2512 @@ class Storage:
             },
         ]
         for prod in products_data:
-            self.products[prod["id"]] = prod
+            product = ProductRecord(prod)
+            self.products[product.id] = product
+            self._index_product(product)
 
-        # review
-        self.review = [
+        # Reviews: prod-1's seeded rating and reviewCount already count this one.
+        self._store_review(
             {
+                "id": "review-1",
+                "productId": "prod-1",
+                "rating": 5,
                 "quote": "I found exactly what I was looking for! The quality is outstanding and the seller was incredibly responsive. Will definitely shop here again.",
                 "name": "Sarah Mitchell",
                 "role": "Customer",
                 "avatar": "https://unsplash.com/photos/closeup-photography-of-woman-smiling-mEZ3PoFGs_k",
+                "createdAt": datetime.now().isoformat(),
             }
-            #   {
-            #     quote: "Amazing platform for discovering unique products. The checkout process was smooth and my order arrived quickly. Highly recommend!",
-            #     name: "Michael Chen",
-            #     role: "Customer",
-            #     avatar: customerAvatar2
-            #   },
-            #   {
-            #     quote: "As a seller, this platform has transformed my business. The tools are easy to use and I've reached so many new customers. Couldn't be happier!",
-            #     name: "Emma Rodriguez",
-            #     role: "Seller",
-            #     avatar: sellerAvatar1
-            #   },
-            #   {
-            #     quote: "I've been selling here for 6 months and my revenue has tripled. The seller dashboard makes managing everything so simple. Best decision ever!",
-            #     name: "David Thompson",
-            #     role: "Seller",
-            #     avatar: sellerAvatar2
-            #   },
-        ]
+        )
 
-    # Products
-    def get_products(
-        self,
-        category_id: Optional[str] = None,
-        search: Optional[str] = None,
-        seller_id: Optional[str] = None,
-        limit: Optional[int] = None,
-        offset: Optional[int] = None,
-    ):
-        products = list(self.products.values())
+    # Change events
+    @staticmethod
+    def _listing(product: ProductRecord) -> tuple:
+        """What a product's change events depend on from its old state."""
+        return (product.id, product.sellerId, product.status == "active")
 
-        if category_id and category_id != "all":
-            products = [p for p in products if p["categoryId"] == category_id]
+    def _publish_product(self, before: Optional[tuple], after: Optional[ProductRecord]):
+        """Publish a product's new state, given its ``_listing`` from before
+        the change (None if it is new) and the product (None if deleted).
+        Sellers whose active listing count moved also get fresh stats.
+        Caller holds _lock."""
+        listed = {}
+        if before is not None:
+            product_id, seller_id, active = before
+            listed[seller_id] = -active
+        if after is not None:
+            product_id = after.id
+            listed[after.sellerId] = listed.get(after.sellerId, 0) + (after.status == "active")
+        key = f"product:{product_id}"
+        topics = (key, *(f"seller:{seller_id}" for seller_id in listed))
+        if after is None:
+            self._changes.publish("productDeleted", key, topics, {"id": product_id})
+        else:
+            state = after.state()
+            self._changes.publish(
+                "product", key, topics, lambda: ProductRecord.from_state(state).to_dict()
+            )
+        for seller_id, moved in listed.items():
+            if moved:
+                self._publish_stats(seller_id)
 
-        if search:
-            search_lower = search.lower()
-            products = [
-                p
-                for p in products
-                if search_lower in p["name"].lower()
-                or search_lower in p["description"].lower()
-            ]
+    def _publish_order(self, order: dict):
+        """Caller holds _lock."""
+        self._changes.publish(
+            "order", f"order:{order['id']}", (f"seller:{order['sellerId']}",), order
+        )
+        self._publish_stats(order["sellerId"])
 
-        if seller_id:
-            products = [p for p in products if p["sellerId"] == seller_id]
+    def _publish_stats(self, seller_id: str):
+        self._changes.publish(
+            "stats",
+            f"stats:{seller_id}",
+            (f"seller:{seller_id}",),
+            {"sellerId": seller_id, **self._current_stats(seller_id)},
+        )
 
-        # Pagination
-        offset = offset or 0
-        if limit:
-            products = products[offset : offset + limit]
+    def get_changes(self, after: Optional[int] = None, timeout: float = 0.0) -> dict:
+        """Change events published after sequence number ``after``, waiting
+        up to ``timeout`` seconds for one; see ChangeFeed.read."""
+        return self._changes.read(after, timeout)
+
+    # Persistence
+    def _log(self, op: str, **payload):
+        if self._journal is None:
+            return
+        self._journal.append({"op": op, **payload})
+        # The caller holds some of the locks a snapshot needs, so compact
+        # from a thread that can wait for all of them.
+        journal = self._journal
+        if (
+            journal.records >= self._snapshot_every or journal.size >= self._snapshot_bytes
+        ) and self._snapshot_guard.acquire(blocking=False):
+            threading.Thread(
+                target=self._background_snapshot, name="storage-snapshot", daemon=True
+            ).start()
+
+    def _background_snapshot(self):
+        try:
+            self._write_snapshot()
+        finally:
+            self._snapshot_guard.release()
+
+    def _apply(self, record: dict):
+        """Replay one journal record. Records carry the resulting state, so
+        replaying a record that is already reflected is harmless."""
+        op = record["op"]
+        if op == "put_product":
+            self._put_products([ProductRecord(record["product"])])
+        elif op == "put_products":
+            self._put_products([ProductRecord(p) for p in record["products"]])
+        elif op == "delete_product":
+            self.delete_product(record["id"])
+        elif op == "put_category":
+            self._store_category(record["category"])
+        elif op == "put_cart_item":
+            item = record["item"]
+            if item["id"] in self.cart_items:
+                self.update_cart_item(item["id"], item["quantity"])
+            else:
+                self.cart_items[item["id"]] = item
+                self._index_cart_item(item)
+        elif op == "delete_cart_item":
+            self.remove_from_cart(record["id"])
+        elif op == "clear_cart":
+            self.clear_cart(record["sessionId"])
+        elif op == "checkout":
+            for product in record["products"]:
+                self._apply({"op": "put_product", "product": product})
+            for order in record["orders"]:
+                self._apply({"op": "put_order", "order": order})
+            self.clear_cart(record["sessionId"])
+        elif op == "put_order":
+            order = record["order"]
+            if order["id"] not in self.orders:
+                self.orders[order["id"]] = order
+                self._index_order(order, to_cents(order["total"]))
+        elif op == "put_orders":
+            for order in record["orders"]:
+                self._apply({"op": "put_order", "order": order})
+        elif op == "put_review":
+            if record["review"]["id"] not in self.reviews:
+                self._store_review(record["review"])
+            product = ProductRecord(record["product"])
+            self._put_products([product])
+            self._rating_totals[product.id] = (
+                product.reviewCount,
+                product.rating_tenths,
+                record["ratingTotal"],
+            )
         else:
-            products = products[offset:]
+            raise ValueError(f"Unknown journal op: {op!r}")
 
-        return products
+    def _recover(self, data_dir: str) -> bool:
+        """Load the snapshot and replay the journal. Returns False if the
+        directory holds no prior state."""
+        snapshot_path = os.path.join(data_dir, self.SNAPSHOT_FILE)
+        journal_path = os.path.join(data_dir, self.JOURNAL_FILE)
+        if not os.path.exists(snapshot_path) and not os.path.exists(journal_path):
+            os.makedirs(data_dir, exist_ok=True)
+            return False
 
-    def get_product(self, product_id: str):
-        return self.products.get(product_id)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as f:
+                state = json.load(f)
+            for category in state["categories"]:
+                self._store_category(category)
+            self._put_products([ProductRecord(p) for p in state["products"]])
+            for item in state["cartItems"]:
+                self._apply({"op": "put_cart_item", "item": item})
+            for order in state["orders"]:
+                self._apply({"op": "put_order", "order": order})
+            for review in state.get("reviews", ()):
+                self._store_review(review)
+            self._rating_totals = {
+                product_id: tuple(total)
+                for product_id, total in state.get("ratingTotals", {}).items()
+            }
 
-    def create_product(self, product_data: dict):
-        product_id = str(uuid4())
-        product = {"id": product_id, "rating": "0", "reviewCount": 0, **product_data}
-        self.products[product_id] = product
-        return product
+        for record in Journal.read(journal_path):
+            self._apply(record)
+        return True
 
-    def update_product(self, product_id: str, updates: dict):
-        if product_id not in self.products:
-            return None
-        product = self.products[product_id]
-        product.update(updates)
-        return product
+    def snapshot(self):
+        """Write a compacted snapshot of the whole store and drop the journal
+        records it covers."""
+        with self._snapshot_guard:
+            self._write_snapshot()
 
-    def delete_product(self, product_id: str):
-        if product_id in self.products:
-            del self.products[product_id]
+    def _write_snapshot(self):
+        # The caller holds _snapshot_guard, so snapshots never interleave.
+        if self._journal is None:
+            return
+        # Every writer logs while holding one of these, so the copy and the
+        # journal mark agree. Products and cart lines change in place; the
+        # other records are replaced, never edited, and are shared as is.
+        with self._session_locks.all(), self._product_locks.all(), self._lock:
+            products = [self.products[pid].state() for _, pid in self._product_order.iter_from()]
+            state = {
+                "categories": list(self.categories.values()),
+                "cartItems": [dict(item) for item in self.cart_items.values()],
+                "orders": [self.orders[oid] for _, oid in self._order_order.iter_from()],
+                "reviews": list(self.reviews.values()),
+                "ratingTotals": dict(self._rating_totals),
+            }
+            mark = self._journal.mark()
+        state["products"] = [ProductRecord.from_state(p).to_dict() for p in products]
+        del products
+
+        path = os.path.join(self._data_dir, self.SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        fsync_dir(self._data_dir)
+        # A crash before this point replays the old journal over the new
+        # snapshot, which converges to the same state.
+        self._journal.truncate(mark)
+
+    def sync(self, timeout: Optional[float] = None) -> bool:
+        """Block until every mutation made so far is durable."""
+        if self._journal is None:
             return True
-        return False
+        return self._journal.wait(timeout=timeout)
 
-    # Categories
-    def get_categories(self):
-        return list(self.categories.values())
+    def close(self):
+        with self._snapshot_guard:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
 
-    def get_category(self, category_id: str):
-        return self.categories.get(category_id)
+    # Index maintenance
+    @staticmethod
+    def _index_add(index: dict, key: str, record_id: str):
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = index[key] = {}
+        bucket[record_id] = None
 
-    def create_category(self, category_data: dict):
-        category_id = str(uuid4())
-        category = {"id": category_id, **category_data}
-        self.categories[category_id] = category
-        return category
+    @staticmethod
+    def _index_discard(index: dict, key: str, record_id: str):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.pop(record_id, None)
+        if not bucket:
+            del index[key]
 
-    # Cart
-    def get_cart_items(self, session_id: str):
-        return [
-            item for item in self.cart_items.values() if item["sessionId"] == session_id
-        ]
+    @staticmethod
+    def _ordered_add(index: dict, key: str, sort_key, record_id: str):
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = index[key] = OrderedIndex()
+        bucket.add(sort_key, record_id)
 
-    def get_cart_item(self, item_id: str):
-        return self.cart_items.get(item_id)
+    @staticmethod
+    def _ordered_add_many(index: dict, key: str, entries: list):
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = index[key] = OrderedIndex()
+        bucket.add_many(entries)
 
-    def add_to_cart(self, item_data: dict):
-        item_id = item_data.get("id")
-        item = {"id": item_id, **item_data}
-        self.cart_items[item_id] = item
+    @staticmethod
+    def _ordered_discard_many(index: dict, key: str, entries: list):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.discard_many(entries)
+        if not bucket:
+            del index[key]
+
+    def _seller_totals(self, seller_id: str) -> dict:
+        totals = self._seller_stats.get(seller_id)
+        if totals is None:
+            totals = self._seller_stats[seller_id] = {
+                "revenueCents": 0,
+                "totalOrders": 0,
+                "activeListings": 0,
+            }
+        return totals
+
+    def _index_product(self, product: ProductRecord, text: bool = True):
+        self._index_products((product,), text)
+
+    def _unindex_product(self, product: ProductRecord, text: bool = True):
+        self._unindex_products((product,), text)
+
+    def _product_index_entries(self, products, new_keys: bool = False):
+        """The entries ``products`` have in the sorted product indexes, as
+        [(index, entries)] plus {bucket key: entries} for the category and
+        seller buckets. ``new_keys`` assigns sequence numbers to products
+        that have none."""
+        keys = self._product_keys
+        order, by_price, by_rating, by_reviews = [], [], [], []
+        by_category, by_seller = {}, {}
+        for product in products:
+            product_id = product.id
+            seq = keys.get(product_id) if new_keys else keys[product_id]
+            if seq is None:
+                seq = keys[product_id] = next(self._product_seq)
+            entry = (seq, product_id)
+            order.append(entry)
+            by_price.append((product.price_cents, product_id))
+            by_rating.append((product.rating_tenths, product_id))
+            by_reviews.append((product.reviewCount, product_id))
+            by_category.setdefault(product.categoryId, []).append(entry)
+            by_seller.setdefault(product.sellerId, []).append(entry)
+        indexes = [
+            (self._product_order, order),
+            (self._products_by_price, by_price),
+            (self._products_by_rating, by_rating),
+            (self._products_by_reviews, by_reviews),
+        ]
+        buckets = [(self._products_by_category, by_category), (self._products_by_seller, by_seller)]
+        return indexes, buckets
+
+    def _index_products(self, products, text: bool = True):
+        """Add ``products`` to every product index. Each sorted index is
+        merged once for the whole batch."""
+        self._catalog_versions["products"] += 1
+        indexes, buckets = self._product_index_entries(products, new_keys=True)
+        for index, entries in indexes:
+            index.add_many(entries)
+        for index, grouped in buckets:
+            for key, entries in grouped.items():
+                self._ordered_add_many(index, key, entries)
+        if text:
+            self._search.add_many((p.id, p.name, p.description) for p in products)
+        for product in products:
+            if product.status == "active":
+                self._seller_totals(product.sellerId)["activeListings"] += 1
+
+    def _unindex_products(self, products, text: bool = True):
+        self._catalog_versions["products"] += 1
+        indexes, buckets = self._product_index_entries(products)
+        for index, entries in indexes:
+            index.discard_many(entries)
+        for index, grouped in buckets:
+            for key, entries in grouped.items():
+                self._ordered_discard_many(index, key, entries)
+        for product in products:
+            if text:
+                self._search.remove(product.id)
+            if product.status == "active":
+                self._seller_totals(product.sellerId)["activeListings"] -= 1
+
+    def _index_order(self, order: dict, total_cents: int):
+        self._order_order.add(order["createdAt"], order["id"])
+        self._ordered_add(self._orders_by_seller, order["sellerId"], order["createdAt"], order["id"])
+        totals = self._seller_totals(order["sellerId"])
+        totals["revenueCents"] += total_cents
+        totals["totalOrders"] += 1
+        self._roll_up_order(order, total_cents)
+        product_ids = [line["productId"] for line in order.get("items", ())]
+        for i in range(len(product_ids) - 1):
+            self._related.record(product_ids[i], product_ids[i + 1 :], RELATED_ORDER_WEIGHT)
+
+    def _roll_up_order(self, order: dict, total_cents: int):
+        rollups = self._sales_rollups
+        seller_id = order["sellerId"]
+        created_at = order["createdAt"]
+        units = 0
+        for line in order.get("items", ()):
+            key = (seller_id, line["productId"])
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = SalesRollup()
+            rollup.add(created_at, to_cents(line["price"]) * line["quantity"], line["quantity"])
+            units += line["quantity"]
+        rollup = rollups.get((seller_id, None))
+        if rollup is None:
+            rollup = rollups[seller_id, None] = SalesRollup()
+        rollup.add(created_at, total_cents, units)
+
+    def _line_price_cents(self, item: dict) -> int:
+        product = self.products.get(item["productId"])
+        return product.price_cents if product is not None else 0
+
+    def _index_cart_item(self, item: dict):
+        in_cart = self._cart_by_session.get(item["sessionId"])
+        if in_cart:
+            cart_items = self.cart_items
+            self._related.record(
+                item["productId"],
+                tuple(cart_items[item_id]["productId"] for item_id in in_cart),
+                RELATED_CART_WEIGHT,
+            )
+        self._index_add(self._cart_by_session, item["sessionId"], item["id"])
+        self._index_add(self._cart_lines_by_product, item["productId"], item["id"])
+        line_cents = item["quantity"] * self._line_price_cents(item)
+        with self._summary_lock:
+            self._touch_cart(item["sessionId"])
+            summary = self._cart_summaries.get(item["sessionId"])
+            if summary is None:
+                summary = self._cart_summaries[item["sessionId"]] = {
+                    "lines": 0,
+                    "itemCount": 0,
+                    "subtotalCents": 0,
+                }
+            summary["lines"] += 1
+            summary["itemCount"] += item["quantity"]
+            summary["subtotalCents"] += line_cents
+
+    def _unindex_cart_item(self, item: dict):
+        self._index_discard(self._cart_by_session, item["sessionId"], item["id"])
+        self._index_discard(self._cart_lines_by_product, item["productId"], item["id"])
+        line_cents = item["quantity"] * self._line_price_cents(item)
+        with self._summary_lock:
+            summary = self._cart_summaries[item["sessionId"]]
+            summary["lines"] -= 1
+            if not summary["lines"]:
+                del self._cart_summaries[item["sessionId"]]
+                del self._cart_touched[item["sessionId"]]
+                return
+            self._touch_cart(item["sessionId"])
+            summary["itemCount"] -= item["quantity"]
+            summary["subtotalCents"] -= line_cents
+
+    def _reprice_cart_lines(
+        self, product_id: str, old_cents: Optional[int], new_cents: Optional[int]
+    ):
+        """Carry a product price change (None = no such product) into the
+        subtotals of every cart holding it. Caller holds the product's lock."""
+        delta = (new_cents or 0) - (old_cents or 0)
+        if not delta:
+            return
+        for item_id in self._cart_lines_by_product.get(product_id, ()):
+            item = self.cart_items[item_id]
+            with self._summary_lock:
+                self._cart_summaries[item["sessionId"]]["subtotalCents"] += (
+                    item["quantity"] * delta
+                )
+
+    @staticmethod
+    def _paginate(entries, records: dict, limit: Optional[int], where=None):
+        """Return (record ids, next cursor) for one page of ``entries``."""
+        limit = page_size(limit)
+        ids = []
+        last = None
+        for entry in entries:
+            if where is not None and not where(records[entry[1]]):
+                continue
+            if len(ids) == limit:
+                return ids, encode_cursor(last)
+            ids.append(entry[1])
+            last = entry
+        return ids, None
+
+    @staticmethod
+    def _page_json(fragments, next_cursor: Optional[str]) -> bytes:
+        return (
+            b'{"items":'
+            + json_array(fragments)
+            + b',"nextCursor":'
+            + encode_json(next_cursor)
+            + b"}"
+        )
+
+    # Products
+    # sort parameter -> (index, descending). Every index is keyed by
+    # (integer, product id), so cursors work the same way for all of them.
+    PRODUCT_SORTS = {
+        None: ("_product_order", False),
+        "newest": ("_product_order", True),
+        "price": ("_products_by_price", False),
+        "-price": ("_products_by_price", True),
+        "rating": ("_products_by_rating", False),
+        "-rating": ("_products_by_rating", True),
+        "reviewCount": ("_products_by_reviews", False),
+        "-reviewCount": ("_products_by_reviews", True),
+    }
+    NO_BOUNDS = (None, None, None, False)
+
+    @staticmethod
+    def _parse_product_filters(filters: Optional[dict]) -> tuple:
+        """(min price cents, max price cents, min rating tenths, in stock)
+        from a ``{"minPrice", "maxPrice", "minRating", "inStock"}`` dict."""
+        if not filters:
+            return Storage.NO_BOUNDS
+        min_price = filters.get("minPrice")
+        max_price = filters.get("maxPrice")
+        min_rating = filters.get("minRating")
+        return (
+            to_cents(min_price) if min_price is not None else None,
+            to_cents(max_price) if max_price is not None else None,
+            to_tenths(min_rating) if min_rating is not None else None,
+            bool(filters.get("inStock")),
+        )
+
+    @staticmethod
+    def _product_filter(category_id, seller_id, bounds):
+        """Predicate for the listing filters, or None if there are none."""
+        if category_id is None and seller_id is None and bounds == Storage.NO_BOUNDS:
+            return None
+        min_price, max_price, min_rating, in_stock = bounds
+
+        def where(p):
+            return (
+                (category_id is None or p.categoryId == category_id)
+                and (seller_id is None or p.sellerId == seller_id)
+                and (min_price is None or p.price_cents >= min_price)
+                and (max_price is None or p.price_cents <= max_price)
+                and (min_rating is None or p.rating_tenths >= min_rating)
+                and (not in_stock or p.stock > 0)
+            )
+
+        return where
+
+    def _index_span(self, index_name: str, bounds):
+        """The part of a listing index its own range filter allows."""
+        min_price, max_price, min_rating, _ = bounds
+        index = getattr(self, index_name)
+        if index_name == "_products_by_price":
+            return index.span(min_price, max_price)
+        if index_name == "_products_by_rating":
+            return index.span(min_rating)
+        return 0, len(index)
+
+    def _narrowest_source(self, category_id, seller_id, bounds):
+        """The smallest index range that contains every match, as (size,
+        index, start, stop, index name of its key order, residual filter).
+        The residual filter leaves out whatever the range already enforces.
+        """
+        min_price, max_price, min_rating, in_stock = bounds
+        sources = [
+            (len(self._product_order), self._product_order, 0, len(self._product_order),
+             "_product_order", (category_id, seller_id, bounds)),
+        ]
+        if min_price is not None or max_price is not None:
+            start, stop = self._index_span("_products_by_price", bounds)
+            sources.append(
+                (stop - start, self._products_by_price, start, stop, "_products_by_price",
+                 (category_id, seller_id, (None, None, min_rating, in_stock)))
+            )
+        if min_rating is not None:
+            start, stop = self._index_span("_products_by_rating", bounds)
+            sources.append(
+                (stop - start, self._products_by_rating, start, stop, "_products_by_rating",
+                 (category_id, seller_id, (min_price, max_price, None, in_stock)))
+            )
+        # Category and seller buckets are keyed like _product_order.
+        if category_id is not None:
+            bucket = self._products_by_category.get(category_id) or OrderedIndex()
+            sources.append(
+                (len(bucket), bucket, 0, len(bucket), "_product_order", (None, seller_id, bounds))
+            )
+        if seller_id is not None:
+            bucket = self._products_by_seller.get(seller_id) or OrderedIndex()
+            sources.append(
+                (len(bucket), bucket, 0, len(bucket), "_product_order", (category_id, None, bounds))
+            )
+        return min(sources, key=lambda source: source[0])
+
+    def _sort_key(self, index_name: str, product: ProductRecord) -> int:
+        if index_name == "_products_by_price":
+            return product.price_cents
+        if index_name == "_products_by_rating":
+            return product.rating_tenths
+        if index_name == "_products_by_reviews":
+            return product.reviewCount
+        return self._product_keys[product.id]
+
+    def _matching_ids(self, category_id, seller_id, bounds, search: Optional[str]):
+        """Ids of every product matching the filters, in no particular order."""
+        products = self.products
+        if search:
+            ids = self._search_products(search, category_id, seller_id)
+            where = self._product_filter(None, None, bounds)
+        else:
+            _, index, start, stop, _, residual = self._narrowest_source(
+                category_id, seller_id, bounds
+            )
+            ids = index.ids(start, stop)
+            where = self._product_filter(*residual)
+        if where is None:
+            return ids
+        return [pid for pid in ids if where(products[pid])]
+
+    def _product_entries(
+        self,
+        category_id: Optional[str],
+        seller_id: Optional[str],
+        bounds: tuple,
+        sort: Optional[str],
+        after: Optional[tuple] = None,
+        search: Optional[str] = None,
+        want: Optional[int] = None,
+    ):
+        """(sort key, id) entries of the matching products in ``sort``
+        order, strictly after ``after``.
+
+        Either streams an index already in sort order, filtering as it
+        goes, or collects the matches from the narrowest index range and
+        sorts them. Streaming the sort index for ``want`` matches reads
+        about ``want * sort span / matches`` entries, so it is chosen when
+        that beats sorting the narrowest range.
+        """
+        index_name, descending = self.PRODUCT_SORTS[sort]
+        products = self.products
+
+        if not search:
+            size, source, start, stop, order, residual = self._narrowest_source(
+                category_id, seller_id, bounds
+            )
+            sort_start, sort_stop = self._index_span(index_name, bounds)
+            if order != index_name and (
+                want is not None and size and want * (sort_stop - sort_start) <= size * size
+            ):
+                source = getattr(self, index_name)
+                start, stop, order = sort_start, sort_stop, index_name
+                residual = (category_id, seller_id, bounds)
+            if order == index_name:
+                entries = source.iter_span(start, stop, after, descending)
+                where = self._product_filter(*residual)
+                if where is None:
+                    return entries
+                return (e for e in entries if where(products[e[1]]))
+
+        ids = self._matching_ids(category_id, seller_id, bounds, search)
+
+        matches = OrderedIndex.from_entries(
+            (self._sort_key(index_name, products[pid]), pid) for pid in ids
+        )
+        return matches.iter_from(after, descending)
+
+    def _product_ids(
+        self,
+        category_id: Optional[str],
+        search: Optional[str],
+        seller_id: Optional[str],
+        limit: Optional[int],
+        offset: Optional[int],
+        filters: Optional[dict] = None,
+        sort: Optional[str] = None,
+    ) -> List[str]:
+        if category_id == "all":
+            category_id = None
+        if sort not in self.PRODUCT_SORTS:
+            raise ValueError(f"Unknown sort: {sort!r}")
+        bounds = self._parse_product_filters(filters)
+        offset = offset or 0
+        if offset < 0:
+            raise ValueError(f"Invalid offset: {offset!r}")
+        if limit is not None and limit < 1:
+            raise ValueError(f"Invalid limit: {limit!r}")
+        stop = offset + min(limit, MAX_PAGE_SIZE) if limit is not None else None
+
+        if search and sort is None:
+            # Relevance order.
+            scores = self._search_products(search, category_id, seller_id)
+            if bounds != self.NO_BOUNDS:
+                where = self._product_filter(None, None, bounds)
+                products = self.products
+                scores = {pid: s for pid, s in scores.items() if where(products[pid])}
+            if stop is None:
+                ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+            else:
+                ranked = heapq.nlargest(stop, scores, key=scores.__getitem__)
+            return ranked[offset:stop]
+
+        entries = self._product_entries(
+            category_id, seller_id, bounds, sort, search=search, want=stop
+        )
+        return [pid for _, pid in islice(entries, offset, stop)]
+
+    @instrumented
+    @synchronized
+    def get_products(
+        self,
+        category_id: Optional[str] = None,
+        search: Optional[str] = None,
+        seller_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        filters: Optional[dict] = None,
+        sort: Optional[str] = None,
+    ):
+        """Products matching the filters, in creation order (relevance
+        order for a search) unless ``sort`` is one of PRODUCT_SORTS.
+
+        ``filters`` may hold minPrice/maxPrice (money strings), minRating
+        and inStock. Raises ValueError for a bad filter or sort.
+        """
+        ids = self._product_ids(category_id, search, seller_id, limit, offset, filters, sort)
+        return [self.products[pid].to_dict() for pid in ids]
+
+    @instrumented
+    @synchronized
+    def get_products_json(
+        self,
+        category_id: Optional[str] = None,
+        search: Optional[str] = None,
+        seller_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        filters: Optional[dict] = None,
+        sort: Optional[str] = None,
+    ) -> bytes:
+        """``get_products`` as an encoded JSON array."""
+        ids = self._product_ids(category_id, search, seller_id, limit, offset, filters, sort)
+        return json_array(self.products[pid].json() for pid in ids)
+
+    def _product_page(
+        self,
+        category_id: Optional[str],
+        search: Optional[str],
+        seller_id: Optional[str],
+        cursor: Optional[str],
+        limit: Optional[int],
+        filters: Optional[dict] = None,
+        sort: Optional[str] = None,
+    ):
+        if category_id == "all":
+            category_id = None
+        if sort not in self.PRODUCT_SORTS:
+            raise ValueError(f"Unknown sort: {sort!r}")
+        bounds = self._parse_product_filters(filters)
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and not isinstance(after[0], int):
+            raise ValueError("Invalid cursor")
+        entries = self._product_entries(
+            category_id,
+            seller_id,
+            bounds,
+            sort,
+            after,
+            search=search,
+            want=page_size(limit) + 1,
+        )
+        return self._paginate(entries, self.products, limit)
+
+    @instrumented
+    @synchronized
+    def get_products_page(
+        self,
+        category_id: Optional[str] = None,
+        search: Optional[str] = None,
+        seller_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        filters: Optional[dict] = None,
+        sort: Optional[str] = None,
+    ) -> dict:
+        """Keyset-paginated listing, in creation order unless ``sort`` is given.
+
+        ``cursor`` is the ``nextCursor`` of the previous page (requested
+        with the same sort); products created while paging show up at the
+        end instead of shifting pages. Search matches are returned in
+        listing order rather than by relevance so that pages stay stable.
+        """
+        ids, next_cursor = self._product_page(
+            category_id, search, seller_id, cursor, limit, filters, sort
+        )
+        items = [self.products[pid].to_dict() for pid in ids]
+        return {"items": items, "nextCursor": next_cursor}
+
+    @instrumented
+    @synchronized
+    def get_products_page_json(
+        self,
+        category_id: Optional[str] = None,
+        search: Optional[str] = None,
+        seller_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        filters: Optional[dict] = None,
+        sort: Optional[str] = None,
+    ) -> bytes:
+        """``get_products_page`` as encoded JSON."""
+        ids, next_cursor = self._product_page(
+            category_id, search, seller_id, cursor, limit, filters, sort
+        )
+        return self._page_json((self.products[pid].json() for pid in ids), next_cursor)
+
+    def _facet_counts(self, field, category_id, seller_id, bounds, search) -> dict:
+        products = self.products
+        counts = {}
+        for pid in self._matching_ids(category_id, seller_id, bounds, search):
+            key = getattr(products[pid], field)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    @instrumented
+    @synchronized
+    def get_product_facets(
+        self,
+        category_id: Optional[str] = None,
+        search: Optional[str] = None,
+        seller_id: Optional[str] = None,
+        filters: Optional[dict] = None,
+    ) -> dict:
+        """Counts of matching products per category and per seller.
+
+        Each facet applies every filter except its own, so the counts say
+        what picking a different category or seller would return. With no
+        search or range filters they come straight from the bucket sizes.
+        """
+        if category_id == "all":
+            category_id = None
+        bounds = self._parse_product_filters(filters)
+        plain = not search and bounds == self.NO_BOUNDS
+        products = self.products
+
+        if plain and category_id is None and seller_id is None:
+            categories = {key: len(bucket) for key, bucket in self._products_by_category.items()}
+            sellers = {key: len(bucket) for key, bucket in self._products_by_seller.items()}
+        elif category_id is None and seller_id is None:
+            # Both facets count the same matches; one pass does both.
+            categories = {}
+            sellers = {}
+            for pid in self._matching_ids(None, None, bounds, search):
+                product = products[pid]
+                categories[product.categoryId] = categories.get(product.categoryId, 0) + 1
+                sellers[product.sellerId] = sellers.get(product.sellerId, 0) + 1
+        else:
+            categories = self._facet_counts("categoryId", None, seller_id, bounds, search)
+            sellers = self._facet_counts("sellerId", category_id, None, bounds, search)
+        if category_id is not None:
+            total = categories.get(category_id, 0)
+        else:
+            total = sum(categories.values())
+        return {"total": total, "categories": categories, "sellers": sellers}
+
+    def _search_products(
+        self,
+        search: str,
+        category_id: Optional[str],
+        seller_id: Optional[str],
+    ) -> dict:
+        scores = self._search.search(search)
+
+        # Intersect with the category/seller filters, walking whichever
+        # side is smaller.
+        for field, key, index in (
+            ("categoryId", category_id, self._products_by_category),
+            ("sellerId", seller_id, self._products_by_seller),
+        ):
+            if not key or not scores:
+                continue
+            bucket = index.get(key)
+            if bucket is None:
+                return {}
+            if len(bucket) < len(scores):
+                scores = {
+                    pid: scores[pid] for _, pid in bucket.iter_from() if pid in scores
+                }
+            else:
+                products = self.products
+                scores = {
+                    pid: s
+                    for pid, s in scores.items()
+                    if getattr(products[pid], field) == key
+                }
+        return scores
+
+    @synchronized
+    def get_product(self, product_id: str):
+        product = self.products.get(product_id)
+        return product.to_dict() if product is not None else None
+
+    @instrumented
+    @synchronized
+    def get_product_json(self, product_id: str) -> Optional[bytes]:
+        product = self.products.get(product_id)
+        return product.json() if product is not None else None
+
+    @instrumented
+    @synchronized
+    def get_related_json(self, product_id: str, limit: Optional[int] = None) -> Optional[bytes]:
+        """Active products most often carted or ordered with this one, then
+        the newest active products of its category to make up ``limit``
+        (at most RELATED_TOP_K). None if there is no such product."""
+        product = self.products.get(product_id)
+        if product is None:
+            return None
+        limit = min(limit or RELATED_TOP_K, RELATED_TOP_K)
+        products = self.products
+        picked = {product_id: None}
+
+        def take(candidates):
+            for other_id in candidates:
+                if len(picked) > limit:
+                    return
+                other = products.get(other_id)
+                if other is not None and other.status == "active" and other_id not in picked:
+                    picked[other_id] = other.json()
+
+        take(self._related.neighbours(product_id))
+        category = self._products_by_category.get(product.categoryId)
+        if category is not None and len(picked) <= limit:
+            take(other_id for _, other_id in category.iter_from(reverse=True))
+        del picked[product_id]
+        return json_array(picked.values())
+
+    def refresh_related(self) -> int:
+        """Fold carts and orders seen since the last call into the
+        related-products index. Returns how many products' lists changed."""
+        return self._related.refresh()
+
+    def get_related_stats(self) -> dict:
+        return self._related.stats()
+
+    @instrumented
+    def create_product(self, product_data: dict):
+        return self._create_product(str(uuid4()), product_data)
+
+    @staticmethod
+    def _new_product(product_id: str, product_data: dict) -> ProductRecord:
+        return ProductRecord({"id": product_id, "rating": "0", "reviewCount": 0, **product_data})
+
+    def _create_product(self, product_id: str, product_data: dict):
+        product = self._new_product(product_id, product_data)
+        with self._product_locks(product_id):
+            with self._lock:
+                self.products[product_id] = product
+                self._index_product(product)
+                self._publish_product(None, product)
+            self._reprice_cart_lines(product_id, None, product.price_cents)
+            data = product.to_dict()
+            self._log("put_product", product=data)
+        return data
+
+    def create_products(self, items: List[dict]) -> List[dict]:
+        """Create a batch of products in one call.
+
+        Returns one ``{"item": product}`` or ``{"error": message, "status":
+        HTTP status}`` per input.
+        The valid items are stored under one lock hold and journaled as a
+        single record, so readers see all of them or none.
+        """
+        results = []
+        records = []
+        for product_id, product_data in zip(new_ids(len(items)), items):
+            try:
+                record = self._new_product(product_id, product_data)
+            except ValueError as exc:
+                results.append({"error": str(exc), "status": 400})
+                continue
+            records.append(record)
+            results.append(None)
+        if records:
+            with self._product_locks.many([r.id for r in records]):
+                self._put_products(records)
+                with self._lock:
+                    for record in records:
+                        self._publish_product(None, record)
+                products = [r.to_dict() for r in records]
+                self._log("put_products", products=products)
+            created = iter(products)
+            results = [r or {"item": next(created)} for r in results]
+        return results
+
+    def _put_products(self, records: List[ProductRecord]):
+        """Store ``records`` (at most one per id), replacing the products
+        with the same ids, and reprice the carts holding them. Caller
+        holds their product locks, or is recovering. Returns the replaced
+        products' ``_listing`` by id."""
+        with self._lock:
+            replaced = [self.products[r.id] for r in records if r.id in self.products]
+            self._unindex_products(replaced)
+            old_cents = {product.id: product.price_cents for product in replaced}
+            for record in records:
+                self.products[record.id] = record
+            self._index_products(records)
+        for record in records:
+            self._reprice_cart_lines(record.id, old_cents.get(record.id), record.price_cents)
+        return {product.id: self._listing(product) for product in replaced}
+
+    @staticmethod
+    def _import_record(product_id: str, item: dict, base: Optional[ProductRecord]):
+        """``base`` (None for a new product) with ``item``'s fields applied."""
+        if base is not None:
+            data = {**base.to_dict(), **item, "id": product_id}
+        else:
+            data = {"rating": "0", "reviewCount": 0, **item, "id": product_id}
+        missing = [f for f in ProductRecord.FIELDS if f not in data]
+        if missing:
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+        return ProductRecord(data)
+
+    @instrumented
+    def import_products(self, items: List[dict]) -> dict:
+        """Upsert a batch of products.
+
+        An item whose "id" names an existing product replaces that
+        product's fields with its own. Any other item creates a product,
+        under its "id" if it has one. The indexes are updated once for
+        the batch, and it is journaled as a single record. Returns counts
+        of created and updated products, and {"index", "error"} for the
+        items that were rejected.
+        """
+        fresh_ids = iter(new_ids(len(items)))
+        ids = [str(item.get("id") or next(fresh_ids)) for item in items]
+        errors = []
+        # Build and validate without locks, from each product as read now:
+        # product id -> (product or None, its state), the staged record, and
+        # the (index, item) pairs that went into it.
+        seen = {}
+        staged = {}
+        accepted = {}
+        for index, (product_id, item) in enumerate(zip(ids, items)):
+            if product_id not in seen:
+                product = self.products.get(product_id)
+                seen[product_id] = (product, product and product.state())
+            base = staged.get(product_id)
+            if base is None and seen[product_id][0] is not None:
+                base = ProductRecord.from_state(seen[product_id][1])
+            try:
+                staged[product_id] = self._import_record(product_id, item, base)
+            except (ValueError, TypeError) as exc:
+                errors.append({"index": index, "error": str(exc)})
+                continue
+            accepted.setdefault(product_id, []).append((index, item))
+
+        created = updated = 0
+        with self._product_locks.many(list(staged)):
+            for product_id, pairs in accepted.items():
+                product, state = seen[product_id]
+                current = self.products.get(product_id)
+                if current is not product or (current is not None and current.state() != state):
+                    # Created, changed or deleted since it was read: rebuild.
+                    record, kept = current, []
+                    for index, item in pairs:
+                        try:
+                            record = self._import_record(product_id, item, record)
+                        except (ValueError, TypeError) as exc:
+                            errors.append({"index": index, "error": str(exc)})
+                            continue
+                        kept.append((index, item))
+                    staged[product_id] = record if kept else None
+                    pairs = kept
+                if pairs:
+                    created += current is None
+                    updated += len(pairs) - (current is None)
+            records = [record for record in staged.values() if record is not None]
+            if records:
+                replaced = self._put_products(records)
+                with self._lock:
+                    for record in records:
+                        self._publish_product(replaced.get(record.id), record)
+                self._log("put_products", products=[r.to_dict() for r in records])
+        errors.sort(key=lambda error: error["index"])
+        return {"created": created, "updated": updated, "errors": errors}
+
+    @instrumented
+    def update_product(self, product_id: str, updates: dict):
+        if "price" in updates:
+            to_cents(updates["price"])  # reject bad prices before touching indexes
+        text = "name" in updates or "description" in updates
+        with self._product_locks(product_id):
+            product = self.products.get(product_id)
+            if product is None:
+                return None
+            old_cents = product.price_cents
+            before = self._listing(product)
+            with self._lock:
+                self._unindex_product(product, text=text)
+                product.update(updates)
+                self._index_product(product, text=text)
+                self._publish_product(before, product)
+                data = product.to_dict()
+            self._reprice_cart_lines(product_id, old_cents, product.price_cents)
+            self._log("put_product", product=data)
+        return data
+
+    def delete_product(self, product_id: str):
+        with self._product_locks(product_id):
+            with self._lock:
+                product = self.products.pop(product_id, None)
+                if product is None:
+                    return False
+                self._unindex_product(product)
+                del self._product_keys[product_id]
+                self._rating_totals.pop(product_id, None)
+                self._drop_reviews(product_id)
+                self._publish_product(self._listing(product), None)
+            self._reprice_cart_lines(product_id, product.price_cents, None)
+            self._related.discard(product_id)
+            self._log("delete_product", id=product_id)
+        return True
+
+    def get_catalog_version(self, kind: str) -> int:
+        """Current version of the "products" or "categories" catalog."""
+        return self._catalog_versions[kind]
+
+    # Categories
+    @synchronized
+    def get_categories(self):
+        return list(self.categories.values())
+
+    def get_category(self, category_id: str):
+        return self.categories.get(category_id)
+
+    @synchronized
+    def get_categories_json(self) -> bytes:
+        return json_array(self._category_json.values())
+
+    def get_category_json(self, category_id: str) -> Optional[bytes]:
+        return self._category_json.get(category_id)
+
+    def _store_category(self, category: dict):
+        self.categories[category["id"]] = category
+        self._category_json[category["id"]] = encode_json(category)
+        self._catalog_versions["categories"] += 1
+
+    @synchronized
+    def create_category(self, category_data: dict):
+        category_id = str(uuid4())
+        category = {"id": category_id, **category_data}
+        self._store_category(category)
+        self._log("put_category", category=category)
+        return category
+
+    # Cart
+    def get_cart_items(self, session_id: str):
+        with self._session_locks(session_id):
+            return [
+                self.cart_items[item_id]
+                for item_id in self._cart_by_session.get(session_id, ())
+            ]
+
+    def get_cart_item(self, item_id: str):
+        return self.cart_items.get(item_id)
+
+    @instrumented
+    def get_cart(self, session_id: str) -> dict:
+        """A session's cart lines joined with their products, plus its summary."""
+        self._touch_cart_if_live(session_id)
+        products = self.products
+        lines = []
+        warnings = []
+        for item in self.get_cart_items(session_id):
+            product = products.get(item["productId"])
+            lines.append(
+                {"session": item, "product": product.to_dict() if product else None}
+            )
+            warning = self._cart_warning(item, product)
+            if warning is not None:
+                warnings.append(warning)
+        return {"items": lines, "summary": self._format_cart_summary(session_id, warnings)}
+
+    def get_cart_summary(self, session_id: str) -> dict:
+        self._touch_cart_if_live(session_id)
+        products = self.products
+        warnings = []
+        for item in self.get_cart_items(session_id):
+            warning = self._cart_warning(item, products.get(item["productId"]))
+            if warning is not None:
+                warnings.append(warning)
+        return self._format_cart_summary(session_id, warnings)
+
+    def _touch_cart_if_live(self, session_id: str):
+        # Reads keep a cart alive but never start tracking an empty one.
+        with self._summary_lock:
+            if session_id in self._cart_touched:
+                self._touch_cart(session_id)
+
+    @staticmethod
+    def _cart_warning(item: dict, product: Optional[ProductRecord]) -> Optional[dict]:
+        warning = {"itemId": item["id"], "productId": item["productId"]}
+        if item["quantity"] < 1:
+            warning["issue"] = "invalid_quantity"
+        elif product is None:
+            warning["issue"] = "unavailable"
+        elif product.status != "active":
+            warning["issue"] = "inactive"
+        elif product.stock < item["quantity"]:
+            warning["issue"] = "insufficient_stock"
+            warning["available"] = product.stock
+        else:
+            return None
+        return warning
+
+    def _format_cart_summary(self, session_id: str, warnings: List[dict]) -> dict:
+        with self._summary_lock:
+            summary = dict(
+                self._cart_summaries.get(session_id)
+                or {"lines": 0, "itemCount": 0, "subtotalCents": 0}
+            )
+        return {
+            "lines": summary["lines"],
+            "itemCount": summary["itemCount"],
+            "subtotal": format_cents(summary["subtotalCents"]),
+            "warnings": warnings,
+        }
+
+    @instrumented
+    def add_to_cart(self, item_data: dict):
+        """Add ``quantity`` of a product to a session's cart, merging into
+        the session's existing line for that product if there is one."""
+        if item_data["quantity"] < 1:
+            raise ValueError("Invalid quantity")
+        session_id = item_data["sessionId"]
+        with self._session_locks(session_id):
+            for item_id in self._cart_by_session.get(session_id, ()):
+                item = self.cart_items[item_id]
+                if item["productId"] == item_data["productId"]:
+                    return self._set_cart_quantity(
+                        item, item["quantity"] + item_data["quantity"]
+                    )
+            item_id = item_data.get("id") or str(uuid4())
+            return self._add_cart_line({**item_data, "id": item_id})
+
+    def _session_of(self, item_id: str) -> Optional[str]:
+        item = self.cart_items.get(item_id)
+        return item["sessionId"] if item is not None else None
+
+    def update_cart_item(self, item_id: str, quantity: int):
+        session_id = self._session_of(item_id)
+        if session_id is None:
+            return None
+        with self._session_locks(session_id):
+            item = self.cart_items.get(item_id)
+            if item is None:  # removed while we waited
+                return None
+            return self._set_cart_quantity(item, quantity)
+
+    def remove_from_cart(self, item_id: str):
+        session_id = self._session_of(item_id)
+        if session_id is None:
+            return False
+        with self._session_locks(session_id):
+            if item_id not in self.cart_items:
+                return False
+            self._remove_cart_line(item_id)
+            return True
+
+    # The helpers below expect the caller to hold the line's session lock.
+    def _add_cart_line(self, item: dict) -> dict:
+        with self._product_locks(item["productId"]):
+            self.cart_items[item["id"]] = item
+            self._index_cart_item(item)
+        self._log("put_cart_item", item=item)
         return item
 
-    def update_cart_item(self, item_id: str, quantity: int):
-        if item_id not in self.cart_items:
-            return None
-        self.cart_items[item_id]["quantity"] = quantity
-        return self.cart_items[item_id]
+    def _set_cart_quantity(self, item: dict, quantity: int) -> dict:
+        with self._product_locks(item["productId"]):
+            delta = quantity - item["quantity"]
+            item["quantity"] = quantity
+            delta_cents = delta * self._line_price_cents(item)
+            with self._summary_lock:
+                self._touch_cart(item["sessionId"])
+                summary = self._cart_summaries[item["sessionId"]]
+                summary["itemCount"] += delta
+                summary["subtotalCents"] += delta_cents
+        self._log("put_cart_item", item=item)
+        return item
+
+    def _remove_cart_line(self, item_id: str):
+        item = self.cart_items[item_id]
+        with self._product_locks(item["productId"]):
+            del self.cart_items[item_id]
+            self._unindex_cart_item(item)
+        self._log("delete_cart_item", id=item_id)
+
+    @instrumented
+    def update_cart(self, session_id: str, changes: List[dict]) -> List[dict]:
+        """Apply a batch of cart changes for one session in one call.
+
+        A change with ``id`` sets that line's quantity (0 removes it); one
+        with ``productId`` adds to the session's line for the product,
+        creating it if needed. Returns one ``{"item": line}`` (``None`` for
+        removals) or ``{"error": message, "status": HTTP status}`` per change.
+        """
+        with self._session_locks(session_id):
+            return self._update_cart(session_id, changes)
+
+    def _update_cart(self, session_id: str, changes: List[dict]) -> List[dict]:
+        by_product = {
+            self.cart_items[item_id]["productId"]: self.cart_items[item_id]
+            for item_id in self._cart_by_session.get(session_id, ())
+        }
+        fresh_ids = iter(new_ids(len(changes)))
+        results = []
+        for change in changes:
+            quantity = change["quantity"]
+            item_id = change.get("id")
+            if item_id is not None:
+                item = self.cart_items.get(item_id)
+                if item is None or item["sessionId"] != session_id:
+                    results.append({"error": "Cart item not found", "status": 404})
+                elif quantity < 0:
+                    results.append({"error": "Invalid quantity", "status": 400})
+                elif quantity == 0:
+                    self._remove_cart_line(item_id)
+                    by_product.pop(item["productId"], None)
+                    results.append({"item": None})
+                else:
+                    results.append({"item": self._set_cart_quantity(item, quantity)})
+                continue
+
+            product_id = change.get("productId")
+            if product_id is None or quantity < 1:
+                results.append({"error": "Invalid cart change", "status": 400})
+                continue
+            item = by_product.get(product_id)
+            if item is not None:
+                item = self._set_cart_quantity(item, item["quantity"] + quantity)
+            else:
+                item = self._add_cart_line(
+                    {
+                        "id": next(fresh_ids),
+                        "sessionId": session_id,
+                        "productId": product_id,
+                        "quantity": quantity,
+                    }
+                )
+                by_product[product_id] = item
+            results.append({"item": item})
+        return results
+
+    def clear_cart(self, session_id: str):
+        with self._session_locks(session_id):
+            self._clear_cart(session_id)
+
+    def _clear_cart(self, session_id: str):
+        item_ids = self._cart_by_session.get(session_id)
+        if item_ids is None:
+            return
+        with self._product_locks.many(self.cart_items[i]["productId"] for i in item_ids):
+            self._drop_cart_lines(session_id)
+        self._log("clear_cart", sessionId=session_id)
+
+    def _drop_cart_lines(self, session_id: str):
+        # Caller holds the session lock and the locks of its cart's products.
+        for item_id in self._cart_by_session.pop(session_id):
+            item = self.cart_items.pop(item_id)
+            self._index_discard(self._cart_lines_by_product, item["productId"], item_id)
+        with self._summary_lock:
+            del self._cart_summaries[session_id]
+            del self._cart_touched[session_id]
+
+    def _touch_cart(self, session_id: str):
+        # Caller holds _summary_lock.
+        self._cart_touched[session_id] = time.monotonic()
+        self._cart_touched.move_to_end(session_id)
+
+    @staticmethod
+    def _cart_item_bytes(item: dict) -> int:
+        """Approximate memory held by a cart line and its index entries."""
+        return (
+            sys.getsizeof(item)
+            + sum(sys.getsizeof(v) for v in item.values())
+            + 2 * sys.getsizeof(item["id"])  # session and product index slots
+        )
+
+    def evict_expired_carts(
+        self, ttl: float, limit: int = 200, max_seconds: float = 0.005
+    ) -> dict:
+        """Drop carts not touched for ``ttl`` seconds, oldest first.
+
+        Does at most ``limit`` sessions and stops early once ``max_seconds``
+        have passed, so callers can interleave slices with other work.
+        Returns what this slice evicted and whether expired carts remain.
+        """
+        start = time.monotonic()
+        cutoff = start - ttl
+        with self._summary_lock:
+            candidates = []
+            for session_id, touched in self._cart_touched.items():
+                if touched > cutoff or len(candidates) == limit:
+                    break
+                candidates.append(session_id)
+
+        evicted = {"sessions": 0, "items": 0, "bytes": 0}
+        for session_id in candidates:
+            if time.monotonic() - start > max_seconds:
+                break
+            with self._session_locks(session_id):
+                with self._summary_lock:
+                    touched = self._cart_touched.get(session_id)
+                if touched is None or touched > cutoff:
+                    continue  # emptied or used again since we looked
+                items = [self.cart_items[i] for i in self._cart_by_session[session_id]]
+                self._clear_cart(session_id)
+            evicted["sessions"] += 1
+            evicted["items"] += len(items)
+            evicted["bytes"] += sum(self._cart_item_bytes(item) for item in items)
+
+        with self._summary_lock:
+            for key, value in evicted.items():
+                self._cart_evictions[key] += value
+            oldest = next(iter(self._cart_touched.values()), None)
+        evicted["more"] = oldest is not None and oldest <= cutoff
+        return evicted
+
+    def render_metrics(self) -> str:
+        """Prometheus text for this process's Storage method metrics."""
+        return STORAGE_METRICS.render("shop_storage", "method")
+
+    def get_cart_stats(self) -> dict:
+        with self._summary_lock:
+            return {
+                "liveSessions": len(self._cart_summaries),
+                "cartItems": len(self.cart_items),
+                "evictedSessions": self._cart_evictions["sessions"],
+                "evictedItems": self._cart_evictions["items"],
+                "reclaimedBytes": self._cart_evictions["bytes"],
+            }
+
+    # Checkout
+    @instrumented
+    def checkout(self, session_id: str, buyer: dict) -> dict:
+        """Turn a session's cart into orders in one atomic step.
+
+        Lines are priced from current product prices, stock is taken, one
+        pending order is created per seller and the cart is cleared. Raises
+        CheckoutError, leaving everything untouched, if any line's quantity
+        is not positive or its product is gone, inactive or short of stock.
+
+        Only the session's lock and its products' locks are held while the
+        cart is checked, so checkouts contend only where their products
+        overlap; the store-wide lock covers just the final writes.
+        """
+        with self._session_locks(session_id):
+            items = [self.cart_items[i] for i in self._cart_by_session.get(session_id, ())]
+            if not items:
+                raise ValueError("Cart is empty")
+            with self._product_locks.many(item["productId"] for item in items):
+                products = self.products
+                problems = [
+                    warning
+                    for warning in (
+                        self._cart_warning(item, products.get(item["productId"]))
+                        for item in items
+                    )
+                    if warning is not None
+                ]
+                if problems:
+                    raise CheckoutError("Cart cannot be checked out", problems)
+
+                by_seller = {}
+                for item in items:
+                    product = products[item["productId"]]
+                    by_seller.setdefault(product.sellerId, []).append((item, product))
+                created_at = datetime.now().isoformat()
+                orders = []
+                totals = []
+                for order_id, (seller_id, lines) in zip(
+                    new_ids(len(by_seller)), by_seller.items()
+                ):
+                    total_cents = sum(item["quantity"] * p.price_cents for item, p in lines)
+                    totals.append(total_cents)
+                    orders.append(
+                        {
+                            "id": order_id,
+                            "createdAt": created_at,
+                            "sellerId": seller_id,
+                            "buyerName": buyer["buyerName"],
+                            "buyerEmail": buyer["buyerEmail"],
+                            "total": format_cents(total_cents),
+                            "status": "pending",
+                            "items": [
+                                {
+                                    "productId": p.id,
+                                    "name": p.name,
+                                    "quantity": item["quantity"],
+                                    "price": p.price,
+                                }
+                                for item, p in lines
+                            ],
+                        }
+                    )
+
+                with self._lock:
+                    for item in items:
+                        product = products[item["productId"]]
+                        product.update({"stock": product.stock - item["quantity"]})
+                        self._publish_product(self._listing(product), product)
+                    self._catalog_versions["products"] += 1
+                    for order, total_cents in zip(orders, totals):
+                        self.orders[order["id"]] = order
+                        self._index_order(order, total_cents)
+                        self._publish_order(order)
+                    changed = [products[item["productId"]].to_dict() for item in items]
+                self._drop_cart_lines(session_id)
+                self._log(
+                    "checkout", sessionId=session_id, products=changed, orders=orders
+                )
+        return {"orders": orders, "total": format_cents(sum(totals))}
+
+    # Orders
+    def _order_index_for(self, seller_id: Optional[str]):
+        if seller_id:
+            return self._orders_by_seller.get(seller_id, OrderedIndex())
+        return self._order_order
+
+    @instrumented
+    @synchronized
+    def get_orders(self, seller_id: Optional[str] = None):
+        entries = self._order_index_for(seller_id).iter_from(reverse=True)
+        return [self.orders[oid] for _, oid in entries]
+
+    @instrumented
+    @synchronized
+    def get_orders_page(
+        self,
+        seller_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> dict:
+        """Keyset-paginated orders, newest first, optionally only those
+        created in [since, until). Raises ValueError for a bad date."""
+        after = decode_cursor(cursor) if cursor else None
+        index = self._order_index_for(seller_id)
+        start, stop = index.key_span(
+            to_timestamp(since) if since else None, to_timestamp(until) if until else None
+        )
+        entries = index.iter_span(start, stop, after, reverse=True)
+        ids, next_cursor = self._paginate(entries, self.orders, limit)
+        return {"items": [self.orders[oid] for oid in ids], "nextCursor": next_cursor}
+
+    def get_order(self, order_id: str):
+        return self.orders.get(order_id)
+
+    @instrumented
+    def create_order(self, order_data: dict):
+        return self._create_order(str(uuid4()), order_data)
+
+    def _create_order(self, order_id: str, order_data: dict):
+        total_cents = to_cents(order_data["total"])
+        with self._lock:
+            order = self._store_order(order_id, order_data, total_cents)
+            self._log("put_order", order=order)
+        return order
+
+    def _store_order(self, order_id: str, order_data: dict, total_cents: int) -> dict:
+        # Caller holds _lock.
+        order = {"id": order_id, "createdAt": datetime.now().isoformat(), **order_data}
+        self.orders[order_id] = order
+        self._index_order(order, total_cents)
+        self._publish_order(order)
+        return order
+
+    def create_orders(self, items: List[dict]) -> List[dict]:
+        """Create a batch of orders in one call; results, and all-or-none
+        visibility, as in create_products."""
+        results = []
+        valid = []
+        for order_id, order_data in zip(new_ids(len(items)), items):
+            try:
+                valid.append((order_id, order_data, to_cents(order_data["total"])))
+            except ValueError as exc:
+                results.append({"error": str(exc), "status": 400})
+                continue
+            results.append(None)
+        if valid:
+            with self._lock:
+                orders = [self._store_order(*entry) for entry in valid]
+                self._log("put_orders", orders=orders)
+            created = iter(orders)
+            results = [r or {"item": next(created)} for r in results]
+        return results
+
+    # Reviews
+    # How many of the best reviews the top-reviews heap keeps.
+    TOP_REVIEWS = 20
+
+    @instrumented
+    def add_review(self, product_id: str, review_data: dict):
+        """Store a review and fold its stars into the product's rating and
+        reviewCount. Returns None if there is no such product."""
+        return self._add_review(str(uuid4()), product_id, review_data)
+
+    def _add_review(self, review_id: str, product_id: str, review_data: dict):
+        rating = review_data["rating"]
+        if not isinstance(rating, int) or not 1 <= rating <= 5:
+            raise ValueError("Rating must be a whole number from 1 to 5")
+        with self._product_locks(product_id):
+            product = self.products.get(product_id)
+            if product is None:
+                return None
+            before = self._listing(product)
+            with self._lock:
+                review = {
+                    "id": review_id,
+                    "productId": product_id,
+                    "rating": rating,
+                    "quote": review_data.get("quote") or "",
+                    "name": review_data["name"],
+                    "role": review_data.get("role") or "Customer",
+                    "avatar": review_data.get("avatar") or "",
+                    "createdAt": datetime.now().isoformat(),
+                }
+                self._store_review(review)
+                total = self._rate_product(product, rating)
+                self._publish_product(before, product)
+                data = product.to_dict()
+            self._log("put_review", review=review, product=data, ratingTotal=total)
+        return review
+
+    def _store_review(self, review: dict):
+        """Index a review for its product's listing and, if it has a quote,
+        offer it to the top-reviews heap. Caller holds _lock."""
+        self.reviews[review["id"]] = review
+        self._ordered_add(
+            self._reviews_by_product, review["productId"], review["createdAt"], review["id"]
+        )
+        if review["quote"]:
+            entry = (review["rating"], review["createdAt"], review["id"])
+            if len(self._top_reviews) < self.TOP_REVIEWS:
+                heapq.heappush(self._top_reviews, entry)
+            elif entry > self._top_reviews[0]:
+                heapq.heapreplace(self._top_reviews, entry)
+
+    def _drop_reviews(self, product_id: str):
+        """Forget a deleted product's reviews, refilling the top-reviews
+        heap from the rest if any of them were on it. Caller holds _lock."""
+        index = self._reviews_by_product.pop(product_id, None)
+        if index is None:
+            return
+        for _, review_id in index.iter_from():
+            del self.reviews[review_id]
+        top = [entry for entry in self._top_reviews if entry[2] in self.reviews]
+        if len(top) < len(self._top_reviews):
+            self._top_reviews = heapq.nlargest(
+                self.TOP_REVIEWS,
+                (
+                    (review["rating"], review["createdAt"], review["id"])
+                    for review in self.reviews.values()
+                    if review["quote"]
+                ),
+            )
+            heapq.heapify(self._top_reviews)
+
+    def _rate_product(self, product: ProductRecord, stars: int) -> int:
+        """Count one more review of ``stars`` in the product's rating and
+        reviewCount, and return its new star total in tenths. Caller holds
+        _lock."""
+        product_id = product.id
+        reviews = product.reviewCount
+        known = self._rating_totals.get(product_id)
+        if known is not None and known[:2] == (reviews, product.rating_tenths):
+            total = known[2]
+        else:
+            # No running total yet, or the rating was set by hand since:
+            # take the current rating as the average of reviewCount reviews.
+            total = product.rating_tenths * reviews
+        total += stars * 10
+        reviews += 1
+        self._catalog_versions["products"] += 1
+        self._products_by_rating.discard(product.rating_tenths, product_id)
+        self._products_by_reviews.discard(product.reviewCount, product_id)
+        product.rating_tenths = (2 * total + reviews) // (2 * reviews)  # rounded half up
+        product.update({"reviewCount": reviews})
+        self._products_by_rating.add(product.rating_tenths, product_id)
+        self._products_by_reviews.add(reviews, product_id)
+        self._rating_totals[product_id] = (reviews, product.rating_tenths, total)
+        return total
+
+    @instrumented
+    @synchronized
+    def get_reviews_page(
+        self, product_id: str, cursor: Optional[str] = None, limit: Optional[int] = None
+    ) -> Optional[dict]:
+        """Keyset-paginated reviews of a product, newest first, or None if
+        there is no such product."""
+        if product_id not in self.products:
+            return None
+        after = decode_cursor(cursor) if cursor else None
+        index = self._reviews_by_product.get(product_id, OrderedIndex())
+        ids, next_cursor = self._paginate(index.iter_from(after, reverse=True), self.reviews, limit)
+        return {"items": [self.reviews[rid] for rid in ids], "nextCursor": next_cursor}
+
+    @instrumented
+    @synchronized
+    def get_top_reviews(self, limit: Optional[int] = None) -> List[dict]:
+        """The best-rated reviews with a quote, newest first among equal
+        ratings, read off the bounded heap."""
+        entries = heapq.nlargest(limit or self.TOP_REVIEWS, self._top_reviews)
+        return [self.reviews[review_id] for _, _, review_id in entries]
+
+    # Seller Stats
+    @staticmethod
+    def _format_stats(revenue_cents: int, total_orders: int, active_listings: int):
+        revenue = revenue_cents / 100
+        return {
+            "revenue": revenue,
+            "activeListings": active_listings,
+            "totalOrders": total_orders,
+            "avgOrderValue": revenue / total_orders if total_orders > 0 else 0,
+        }
+
+    @instrumented
+    @synchronized
+    def get_seller_stats(self, seller_id: str):
+        return self._current_stats(seller_id)
+
+    def _current_stats(self, seller_id: str) -> dict:
+        totals = self._seller_stats.get(seller_id)
+        if totals is None:
+            return self._format_stats(0, 0, 0)
+        return self._format_stats(
+            totals["revenueCents"], totals["totalOrders"], totals["activeListings"]
+        )
+
+    @instrumented
+    @synchronized
+    def get_sales_timeseries(
+        self,
+        seller_id: str,
+        interval: str = "day",
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        product_id: Optional[str] = None,
+    ) -> dict:
+        """A seller's (or one of its products') revenue, orders and units
+        sold per day, week or month, oldest first, for the buckets that
+        overlap [since, until). Buckets without sales are left out. Read
+        from the sales rollups, so the cost follows the number of buckets,
+        not orders. Raises ValueError for a bad interval or date."""
+        if interval not in SALES_INTERVALS:
+            raise ValueError(f"Unknown interval: {interval!r}")
+        rollup = self._sales_rollups.get((seller_id, product_id))
+        rows = []
+        if rollup is not None:
+            rows = rollup.series(
+                interval,
+                to_timestamp(since) if since else None,
+                to_timestamp(until) if until else None,
+            )
+        return {
+            "sellerId": seller_id,
+            "productId": product_id,
+            "interval": interval,
+            "buckets": [
+                {"start": start[:10], "revenue": cents / 100, "orders": orders, "units": units}
+                for start, cents, orders, units in rows
+            ],
+            "totals": {
+                "revenue": sum(row[1] for row in rows) / 100,
+                "orders": sum(row[2] for row in rows),
+                "units": sum(row[3] for row in rows),
+            },
+        }
+
+    @synchronized
+    def check_seller_stats(self, seller_id: str):
+        """Compare the running aggregates with a full recompute from scratch."""
+        seller_orders = [o for o in self.orders.values() if o["sellerId"] == seller_id]
+        recomputed = self._format_stats(
+            sum(to_cents(o["total"]) for o in seller_orders),
+            len(seller_orders),
+            sum(
+                1
+                for p in self.products.values()
+                if p.sellerId == seller_id and p.status == "active"
+            ),
+        )
+        aggregate = self.get_seller_stats(seller_id)
+        return {
+            "consistent": aggregate == recomputed,
+            "aggregate": aggregate,
+            "recomputed": recomputed,
+        }
+
+
+# Shared storage for multi-worker deployments
+STORAGE_METHODS = [
+    name
+    for name in dir(Storage)
+    if not name.startswith("_") and callable(getattr(Storage, name))
+]
+
+
+class StorageServer(BaseManager):
+    pass
+
+
+class StorageClient(BaseManager):
+    pass
+
+
+def serve_storage(storage: Storage, address, authkey: bytes = b""):
+    """Serve ``storage`` from a background thread and return the bound
+    address. ``address`` is a Unix socket path or a (host, port) pair."""
+    StorageServer.register("get_storage", callable=lambda: storage, exposed=STORAGE_METHODS)
+    server = StorageServer(address=address, authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, name="storage-server", daemon=True).start()
+    return server.address
+
+
+def connect_storage(address, authkey: bytes):
+    """Return a proxy with the Storage method surface for a served storage."""
+    StorageClient.register("get_storage", exposed=STORAGE_METHODS)
+    manager = StorageClient(address=address, authkey=authkey)
+    manager.connect()
+    return manager.get_storage()
+
+
+# Response compression
+COMPRESSION = os.environ.get("SHOP_COMPRESSION", "1") != "0"
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The preferred of "br" (when brotli is installed) and "gzip" that an
+    Accept-Encoding header accepts, or None for no compression."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    default = weights.get("*", 0.0)
+    offered = ("br", "gzip") if brotli is not None else ("gzip",)
+    best = max(offered, key=lambda coding: weights.get(coding, default))
+    return best if weights.get(best, default) > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# HTTP response cache
+class ResponseCache:
+    """LRU cache of serialized GET responses, tagged with the catalog version
+    they were built from so that any Storage mutation invalidates them.
+    Compressed variants are made on first request and kept with the entry,
+    so each is compressed once per version."""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        # key -> (version, etag, body, {encoding: (etag, compressed body)})
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.compressions = 0
+        self.bytes_saved = 0  # response bodies not sent thanks to 304s
+        self.bytes_reused = 0  # response bodies served without re-serializing
+        self.bytes_compressed = 0  # response bytes not sent thanks to compression
+
+    def get(self, key, version: int):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.bytes_reused += len(entry[2])
+        return entry
+
+    def put(self, key, version: int, body: bytes):
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        entry = (version, etag, body, {})
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def encoded(self, entry: tuple, encoding: str) -> tuple:
+        """(etag, body) of ``entry`` compressed with ``encoding``. Each
+        encoding gets its own strong ETag."""
+        variants = entry[3]
+        variant = variants.get(encoding)
+        if variant is None:
+            variant = variants[encoding] = (
+                entry[1][:-1] + "-" + encoding + '"',
+                compress(entry[2], encoding),
+            )
+            self.compressions += 1
+        return variant
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "notModified": self.not_modified,
+            "compressions": self.compressions,
+            "bytesSaved": self.bytes_saved,
+            "bytesReused": self.bytes_reused,
+            "bytesCompressed": self.bytes_compressed,
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison.
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+# Server-sent events
+class Subscriber:
+    """One event-stream client's undelivered events.
+
+    Events are kept by key, so a burst of changes to one product or one
+    seller's stats leaves only the newest. The buffer is bounded: when a
+    slow client lets it fill, it is dropped and the client is told to
+    reset, which means re-reading whatever it displays. Publishers never
+    wait for a client.
+    """
+
+    def __init__(self, topics: frozenset, capacity: int):
+        self.topics = topics
+        self.capacity = capacity
+        self.pending = OrderedDict()  # event key -> encoded frame, oldest first
+        self.reset = False
+        self.coalesced = 0
+        self.wakeup = asyncio.Event()
+
+    def offer(self, key: str, frame: bytes):
+        if self.pending.pop(key, None) is not None:
+            self.coalesced += 1
+        elif len(self.pending) >= self.capacity:
+            self.pending.clear()
+            self.reset = True
+        self.pending[key] = frame
+        self.wakeup.set()
+
+    def take(self):
+        """(reset, frames) offered since the last call."""
+        self.wakeup.clear()
+        reset, frames = self.reset, list(self.pending.values())
+        self.reset = False
+        self.pending.clear()
+        return reset, frames
+
+
+class EventHub:
+    """Fans the Storage change feed out to this process's subscribers.
+
+    A single pump task long-polls ``Storage.get_changes`` while anyone is
+    subscribed, so each change costs one storage read however many
+    clients are listening, including when the storage lives in another
+    process.
+    """
 
-    def remove_from_cart(self, item_id: str):
-        if item_id in self.cart_items["session"]:
-            del self.cart_items[item_id]
+    def __init__(self, capacity: int = 256, poll_timeout: float = 1.0):
+        self.capacity = capacity
+        self.poll_timeout = poll_timeout
+        self._by_topic = {}  # topic -> set of Subscriber
+        self._subscribers = set()
+        self._pump = None
+        self.delivered = 0
+        self.coalesced = 0
+        self.resets = 0
+
+    async def subscribe(self, topics) -> Subscriber:
+        subscriber = Subscriber(frozenset(topics), self.capacity)
+        if self._pump is None:
+            # Start from the current position, so nothing published after
+            # this subscription is missed.
+            position = (await run_in_threadpool(storage.get_changes))["last"]
+            if self._pump is None:
+                self._pump = asyncio.create_task(self._run(position))
+        self._subscribers.add(subscriber)
+        for topic in subscriber.topics:
+            self._by_topic.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        for topic in subscriber.topics:
+            listeners = self._by_topic.get(topic)
+            if listeners is not None:
+                listeners.discard(subscriber)
+                if not listeners:
+                    del self._by_topic[topic]
+        self.coalesced += subscriber.coalesced
+
+    def deliver(self, batch: dict):
+        if batch["reset"]:
+            for subscriber in self._subscribers:
+                subscriber.reset = True
+                subscriber.wakeup.set()
+        # Coalesce the batch once, before paying for it per listener.
+        latest = {}
+        for event in batch["events"]:
+            latest.pop(event["key"], None)
+            latest[event["key"]] = event
+        self.coalesced += len(batch["events"]) - len(latest)
+        by_topic = self._by_topic
+        for event in latest.values():
+            listeners = set()
+            for topic in event["topics"]:
+                listeners.update(by_topic.get(topic, ()))
+            if listeners:
+                # Encoded once, shared by every listener.
+                frame = sse_frame(event)
+                for subscriber in listeners:
+                    subscriber.offer(event["key"], frame)
+
+    async def _run(self, position: int):
+        try:
+            while self._subscribers:
+                batch = await run_in_threadpool(
+                    storage.get_changes, position, self.poll_timeout
+                )
+                self.deliver(batch)
+                position = batch["last"]
+        finally:
+            self._pump = None
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "delivered": self.delivered,
+            "coalesced": self.coalesced + sum(s.coalesced for s in self._subscribers),
+            "resets": self.resets,
+        }
+
+
+def sse_frame(event: dict) -> bytes:
+    return (
+        f"id: {event['seq']}\nevent: {event['type']}\ndata: ".encode()
+        + encode_json(event["data"])
+        + b"\n\n"
+    )
+
+
+# Admission control
+REQUEST_CLASSES = ("order", "cart", "read", "expensive")  # in priority order
+ORDER, CART, READ, EXPENSIVE = range(len(REQUEST_CLASSES))
+
+
+def request_class(method: str, path: str, query: bytes) -> Optional[int]:
+    """The admission class of a request, or None for those admission
+    control leaves alone: anything outside /api, and the event stream,
+    which stays open for as long as the client listens."""
+    if not path.startswith("/api/") or path == "/api/events":
+        return None
+    if method not in ("GET", "HEAD"):
+        if path.startswith(("/api/orders", "/api/checkout")):
+            return ORDER
+        return CART if path.startswith("/api/cart") else READ
+    if path == "/api/products":
+        params = {part.partition(b"=")[0] for part in query.split(b"&")}
+        # Searches, and listings that are not paged, touch many products.
+        if b"search" in params or not params & {b"limit", b"cursor"}:
+            return EXPENSIVE
+    elif path == "/api/products/facets" or path.endswith("/export"):
+        return EXPENSIVE
+    return READ
+
+
+class TokenBuckets:
+    """One token bucket per client: ``rate`` requests a second on average,
+    in bursts of up to ``burst``. Only the ``max_clients`` most recently
+    seen clients are remembered; a forgotten one starts again with a full
+    bucket. A rate of 0 turns limiting off."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> [tokens, last refill], oldest first
+
+    def take(self, client: str, now: float) -> float:
+        """Spend a token; 0 if there was one, otherwise the seconds until
+        there will be."""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionController:
+    """Decides when each request runs, so that under overload checkout
+    stays fast and the cost lands on searches.
+
+    At most ``limit`` requests are in flight: admitted, with no response
+    started yet. Normally a request runs as soon as it arrives. Once queue
+    delay passes ``target`` the controller is congested and arrivals are
+    parked. Parked requests are admitted in priority order as slots free
+    up: orders and checkouts, then cart changes, then reads, then
+    expensive reads. While congested, new expensive reads are refused
+    instead of parked, and anything else that waited longer than
+    ``max_wait`` is dropped rather than run for a client that has likely
+    given up. Orders are never shed.
+
+    Handlers run on the event loop, so in a single process overload shows
+    up first as loop lag, which is probed every ``interval``. Queue delay
+    is the largest of that lag, the shortest wait of the requests
+    admitted from the queue since the last probe (as in CoDel, a burst
+    that drains within an interval is not a standing queue) and the wait
+    so far of the oldest request still parked.
+
+    State lives on the event loop and takes no locks; each worker process
+    has its own.
+    """
+
+    def __init__(
+        self,
+        limit: int = 8,
+        target: float = 0.05,
+        interval: float = 0.1,
+        max_wait: float = 0.25,
+        max_queue: int = 1024,
+        rate: float = 0.0,
+        burst: float = 40.0,
+    ):
+        self.limit = limit
+        self.target = target
+        self.interval = interval
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.buckets = TokenBuckets(rate, burst)
+        self.in_flight = 0
+        self.congested = False
+        self.queue_delay = 0.0
+        self.loop_lag = 0.0
+        self.admitted = [0] * len(REQUEST_CLASSES)
+        self.shed = [0] * len(REQUEST_CLASSES)
+        self.rate_limited = 0
+        self._queues = [deque() for _ in REQUEST_CLASSES]  # (future, parked at)
+        self._waiting = 0
+        self._shortest_wait = None  # of those admitted from the queue since the last probe
+        self._next_probe = 0.0
+        self._grant_loop = None  # the loop a _grant is scheduled on, if any
+
+    async def admit(self, priority: int) -> bool:
+        """Wait for a slot; False if the request is shed instead."""
+        now = time.monotonic()
+        loop = asyncio.get_running_loop()
+        if now >= self._next_probe:
+            self._start_probe(loop, now)
+        if not (self.congested or self._waiting or self.in_flight >= self.limit):
+            self.in_flight += 1
+            self.admitted[priority] += 1
             return True
-        return False
+        if priority != ORDER and (
+            (self.congested and priority == EXPENSIVE) or self._waiting >= self.max_queue
+        ):
+            self.shed[priority] += 1
+            return False
+        waiter = loop.create_future()
+        self._queues[priority].append((waiter, now))
+        self._waiting += 1
+        self._schedule_grant(loop)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # The client went away; give back a slot granted meanwhile.
+            if not waiter.cancelled() and waiter.result():
+                self.release()
+            raise
 
-    def clear_cart(self, session_id: str):
-        items_to_delete = [
-            id
-            for id, item in self.cart_items.items()
-            if item["sessionId"] == session_id
-        ]
-        for item_id in items_to_delete:
-            del self.cart_items[item_id]
+    def release(self):
+        self.in_flight -= 1
+        if self._waiting:
+            self._grant()
 
-    # Orders
-    def get_orders(self, seller_id: Optional[str] = None):
-        orders = list(self.orders.values())
-        if seller_id:
-            orders = [o for o in orders if o["sellerId"] == seller_id]
-        return sorted(orders, key=lambda x: x["createdAt"], reverse=True)
+    def _schedule_grant(self, loop):
+        # At the back of the ready queue, so that every request arriving in
+        # this turn of the loop is parked before anyone is chosen.
+        if self._grant_loop is not loop:
+            self._grant_loop = loop
+            loop.call_soon(self._scheduled_grant)
 
-    def get_order(self, order_id: str):
-        return self.orders.get(order_id)
+    def _scheduled_grant(self):
+        self._grant_loop = None
+        self._grant()
 
-    def create_order(self, order_data: dict):
-        order_id = str(uuid4())
-        order = {"id": order_id, "createdAt": datetime.now().isoformat(), **order_data}
-        self.orders[order_id] = order
-        return order
+    def _grant(self):
+        now = time.monotonic()
+        for priority, queue in enumerate(self._queues):
+            # Stale requests are dropped even when there is no slot for them,
+            # so that higher classes cannot starve them into waiting for ever.
+            while queue:
+                waiter, parked = queue[0]
+                wait = now - parked
+                if waiter.done():
+                    pass  # cancelled while it waited
+                elif priority != ORDER and wait > self.max_wait:
+                    self.shed[priority] += 1
+                    waiter.set_result(False)
+                elif self.in_flight < self.limit:
+                    if self._shortest_wait is None or wait < self._shortest_wait:
+                        self._shortest_wait = wait
+                    self.in_flight += 1
+                    self.admitted[priority] += 1
+                    waiter.set_result(True)
+                else:
+                    break
+                queue.popleft()
+                self._waiting -= 1
 
-    def get_review(self):
-        print(self.review)
-        return self.review
-    # Seller Stats
-    def get_seller_stats(self, seller_id: str):
-        seller_products = [
-            p for p in self.products.values() if p["sellerId"] == seller_id
+    def _start_probe(self, loop, now: float):
+        self._next_probe = now + self.interval
+        loop.call_soon(self._probe, now)
+
+    def _probe_again(self):
+        now = time.monotonic()
+        if now >= self._next_probe:
+            self._start_probe(asyncio.get_running_loop(), now)
+
+    def _probe(self, scheduled: float):
+        now = time.monotonic()
+        self.loop_lag = now - scheduled
+        # Higher classes overtake the queue, so their short waits alone would
+        # hide requests that are still stuck behind them.
+        oldest = max((now - queue[0][1] for queue in self._queues if queue), default=0.0)
+        self.queue_delay = max(self.loop_lag, self._shortest_wait or 0.0, oldest)
+        self._shortest_wait = None
+        self.congested = self.queue_delay > self.target
+        if self.congested:
+            # Arrivals trigger probes; keep probing while congested so that
+            # the state still clears if they stop.
+            asyncio.get_running_loop().call_later(self.interval, self._probe_again)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "inFlight": self.in_flight,
+            "queued": {name: len(q) for name, q in zip(REQUEST_CLASSES, self._queues)},
+            "congested": self.congested,
+            "queueDelayMs": round(self.queue_delay * 1e3, 3),
+            "loopLagMs": round(self.loop_lag * 1e3, 3),
+            "targetMs": round(self.target * 1e3, 3),
+            "admitted": dict(zip(REQUEST_CLASSES, self.admitted)),
+            "shed": dict(zip(REQUEST_CLASSES, self.shed)),
+            "rateLimited": self.rate_limited,
+            "sessions": len(self.buckets),
+        }
+
+
+class AdmissionMiddleware:
+    """Puts /api requests through an AdmissionController: 429 for a client
+    over its rate, 503 for a request shed under overload, both with
+    Retry-After. Clients are told apart by X-Session-ID, or by address
+    when there is none. Plain ASGI, like MetricsMiddleware."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        priority = None
+        if scope["type"] == "http":
+            priority = request_class(scope["method"], scope["path"], scope["query_string"])
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+        controller = self.controller
+        if controller.buckets.rate:
+            wait = controller.buckets.take(self._client(scope), time.monotonic())
+            if wait:
+                controller.rate_limited += 1
+                await self._refuse(send, 429, "Too many requests", wait)
+                return
+        if not controller.limit:
+            await self.app(scope, receive, send)
+            return
+        if not await controller.admit(priority):
+            await self._refuse(send, 503, "Server is busy", 1)
+            return
+        # The slot is given back once the response starts, so that a long
+        # download does not hold it for as long as the client takes to read.
+        released = False
+
+        async def release_on_start(message):
+            nonlocal released
+            if message["type"] == "http.response.start" and not released:
+                released = True
+                controller.release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, release_on_start)
+        finally:
+            if not released:
+                controller.release()
+
+    @staticmethod
+    def _client(scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"x-session-id":
+                return value.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else ""
+
+    @staticmethod
+    async def _refuse(send, status: int, detail: str, retry_after: float):
+        body = encode_json({"detail": detail})
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(math.ceil(retry_after)).encode()),
         ]
-        seller_orders = [o for o in self.orders.values() if o["sellerId"] == seller_id]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+# Bulk product import
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_MAX_ERRORS = 1000  # per import; further failures are only counted
 
-        revenue = sum(float(o["total"]) for o in seller_orders)
-        active_listings = sum(1 for p in seller_products if p["status"] == "active")
-        total_orders = len(seller_orders)
-        avg_order_value = revenue / total_orders if total_orders > 0 else 0
 
+def import_feed(storage, rows, chunk_size: int = IMPORT_CHUNK_SIZE, workers: int = 0):
+    """Validate ``rows`` and upsert them through ``Storage.import_products``
+    a chunk at a time, yielding a progress report after every chunk.
+
+    Each report has running "rows", "created", "updated" and "failed"
+    counts, the chunk's row errors (1-based row numbers) and "done", which
+    is true only on the last one. With ``workers``, chunks are validated
+    in a process pool while earlier ones are being written. At most
+    2 * workers + 1 chunks are held at once.
+    """
+    totals = {"rows": 0, "created": 0, "updated": 0, "failed": 0}
+    reported_errors = 0
+    started = time.perf_counter()
+
+    def chunks():
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def apply(first_row: int, validated: list) -> dict:
+        nonlocal reported_errors
+        errors = []
+        payloads = []
+        positions = []
+        for offset, (payload, error) in enumerate(validated):
+            if error is not None:
+                errors.append({"row": first_row + offset, "error": error})
+            else:
+                payloads.append(payload)
+                positions.append(first_row + offset)
+        if payloads:
+            result = storage.import_products(payloads)
+            totals["created"] += result["created"]
+            totals["updated"] += result["updated"]
+            errors.extend(
+                {"row": positions[e["index"]], "error": e["error"]} for e in result["errors"]
+            )
+            errors.sort(key=lambda e: e["row"])
+        totals["rows"] += len(validated)
+        totals["failed"] += len(errors)
+        errors = errors[: max(0, IMPORT_MAX_ERRORS - reported_errors)]
+        reported_errors += len(errors)
         return {
-            "revenue": revenue,
-            "activeListings": active_listings,
-            "totalOrders": total_orders,
-            "avgOrderValue": avg_order_value,
+            **totals,
+            "seconds": round(time.perf_counter() - started, 3),
+            "errors": errors,
+            "done": False,
         }
 
+    next_row = 1
+    if workers:
+        # Spawned, not forked: a fork of this threaded process would copy
+        # locks other threads hold. The workers import only server/feed.py
+        # and this module, which opens no storage on import.
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=spawn) as pool:
+            pending = deque()
+            for chunk in chunks():
+                pending.append((next_row, pool.submit(validate_product_rows, chunk)))
+                next_row += len(chunk)
+                if len(pending) > 2 * workers:
+                    first_row, future = pending.popleft()
+                    yield apply(first_row, future.result())
+            while pending:
+                first_row, future = pending.popleft()
+                yield apply(first_row, future.result())
+    else:
+        for chunk in chunks():
+            yield apply(next_row, validate_product_rows(chunk))
+            next_row += len(chunk)
+    yield {
+        **totals,
+        "seconds": round(time.perf_counter() - started, 3),
+        "errors": [],
+        "done": True,
+    }
+
 
 # Initialize
-storage = Storage()
+def create_storage() -> Storage:
+    """Build the process-wide Storage from the environment.
+
+    SHOP_STORAGE_ADDRESS (a Unix socket path or host:port) and
+    SHOP_STORAGE_AUTHKEY make this process a client of a storage served by
+    another process. Otherwise
+    SHOP_DATA_DIR enables the durable journal/snapshot backend, and
+    without it everything stays in memory as before.
+    """
+    address = os.environ.get("SHOP_STORAGE_ADDRESS")
+    if address:
+        if not address.startswith("/"):
+            host, port = address.rsplit(":", 1)
+            address = (host, int(port))
+        authkey = bytes.fromhex(os.environ.get("SHOP_STORAGE_AUTHKEY", ""))
+        return connect_storage(address, authkey)
+
+    data_dir = os.environ.get("SHOP_DATA_DIR")
+    if not data_dir:
+        return Storage()
+    return Storage(
+        data_dir=data_dir,
+        fsync=os.environ.get("SHOP_FSYNC", "1") != "0",
+        snapshot_every=int(os.environ.get("SHOP_SNAPSHOT_EVERY", "50000")),
+        snapshot_bytes=int(os.environ.get("SHOP_SNAPSHOT_MB", "64")) << 20,
+    )
+
+
+class _LazyStorage:
+    """Stands in for ``storage`` until it is first used, so that importing
+    this module (as spawned import workers do) opens no journal and starts
+    no threads."""
+
+    def __getattr__(self, name):
+        return getattr(get_storage(), name)
+
+
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """The process-wide Storage, created from the environment on first use."""
+    global storage
+    with _storage_lock:
+        if isinstance(storage, _LazyStorage):
+            storage = create_storage()
+        return storage
+
+
+storage = _LazyStorage()
+DURABLE = bool(os.environ.get("SHOP_DATA_DIR"))
+SHARED = bool(os.environ.get("SHOP_STORAGE_ADDRESS"))
+
+CART_TTL = float(os.environ.get("SHOP_CART_TTL", 7 * 24 * 3600))
+CART_SWEEP_INTERVAL = 60.0
+RELATED_REFRESH_INTERVAL = 5.0
+
+
+async def _evict_expired_carts():
+    # Each slice is bounded in sessions and time; yielding between slices
+    # lets queued requests run during a large sweep.
+    while True:
+        await asyncio.sleep(CART_SWEEP_INTERVAL)
+        while storage.evict_expired_carts(CART_TTL)["more"]:
+            await asyncio.sleep(0)
+
+
+async def _refresh_related():
+    while True:
+        await asyncio.sleep(RELATED_REFRESH_INTERVAL)
+        await run_in_threadpool(storage.refresh_related)
+
 
 # FastAPI App
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_storage()  # open it now rather than on the first request
+    evictor = asyncio.create_task(_evict_expired_carts()) if CART_TTL > 0 else None
+    refresher = asyncio.create_task(_refresh_related())
+    yield
+    if evictor is not None:
+        evictor.cancel()
+    refresher.cancel()
+    # Workers sharing a storage leave closing it to the owning process.
+    if not SHARED:
+        storage.close()
+
+
+app = FastAPI(lifespan=lifespan)
+request_metrics = Metrics()
+admission = AdmissionController(
+    limit=int(os.environ.get("SHOP_MAX_CONCURRENCY", 8)),
+    target=float(os.environ.get("SHOP_QUEUE_TARGET_MS", 50)) / 1000,
+    rate=float(os.environ.get("SHOP_SESSION_RATE", 0)),
+    burst=float(os.environ.get("SHOP_SESSION_BURST", 40)),
+)
+
+
+async def _commit():
+    # Acknowledge writes only once they are on disk. Waiting happens on the
+    # thread pool so concurrent requests share a single group-commit fsync.
+    if DURABLE:
+        await run_in_threadpool(storage.sync)
+
+# Everything _cached_json does not already compress: gzip per response.
+if COMPRESSION:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES, compresslevel=GZIP_LEVEL)
+
+# Outside compression, so refusing a request costs as little as possible,
+# but inside CORS, so browsers can still read the 429 or 503.
+app.add_middleware(AdmissionMiddleware, controller=admission)
 
 # CORS
 app.add_middleware(
@@ -492,50 +3946,373 @@ app.add_middleware(
     allow_headers=["Content-Type"],
 )
 
+# Added last, so it is outermost and times the CORS handling too.
+app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+
+
+response_cache = ResponseCache()
+event_hub = EventHub()
+
+
+def _cached_json(request: Request, kind: str, build) -> Response:
+    """Serve the JSON bytes from ``build()`` through the response cache with
+    ETag revalidation.
+
+    The version is read before building, so a concurrent mutation can only
+    make the cached body newer than its tag, never older.
+    """
+    version = storage.get_catalog_version(kind)
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    entry = response_cache.get(key, version)
+    if entry is None:
+        entry = response_cache.put(key, version, build())
+    _, etag, body, _ = entry
+
+    headers = {"Cache-Control": "no-cache"}
+    encoding = None
+    if COMPRESSION and len(body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        # Uncompressed responses this size get their Vary from GZipMiddleware.
+        headers["Vary"] = "Accept-Encoding"
+        plain_size = len(body)
+        etag, body = response_cache.encoded(entry, encoding)
+    headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        response_cache.bytes_saved += len(body)
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        response_cache.bytes_compressed += plain_size - len(body)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+MAX_BATCH_SIZE = 1000
+
+
+def _validate_batch(model, items: list):
+    """Validate every entry of a batch body in one pass.
+
+    Returns the validated payloads (``None`` where invalid) and the
+    per-entry results list with 400 entries already filled in.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} items"
+        )
+    payloads = []
+    results = []
+    for index, raw in enumerate(items):
+        try:
+            payloads.append(model.model_validate(raw).model_dump())
+            results.append(None)
+        except ValidationError as exc:
+            payloads.append(None)
+            results.append(
+                {"index": index, "status": 400, "error": exc.errors(include_url=False)}
+            )
+    return payloads, results
+
+
+def _merge_batch_results(results: list, applied: list, created: bool = False) -> list:
+    """Slot Storage results for the valid entries into the per-entry list."""
+    applied = iter(applied)
+    for index, result in enumerate(results):
+        if result is not None:
+            continue
+        outcome = next(applied)
+        if "error" in outcome:
+            results[index] = {"index": index, "status": outcome["status"], "error": outcome["error"]}
+        else:
+            status = 201 if created else 200
+            results[index] = {"index": index, "status": status, "item": outcome["item"]}
+    return results
+
+
+def _page_or_400(fetch, **kwargs):
+    # Passing ?cursor= (even empty) opts a listing into keyset pagination
+    # and an {"items", "nextCursor"} response.
+    try:
+        return fetch(**kwargs)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+# Exports
+EXPORT_PAGE_SIZE = 500
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+ORDER_EXPORT_FIELDS = (
+    "id",
+    "createdAt",
+    "sellerId",
+    "buyerName",
+    "buyerEmail",
+    "total",
+    "status",
+    "items",
+)
+
+
+def _export_pages(fetch, **kwargs):
+    """Yield the item lists of a keyset-paginated Storage listing.
+
+    The first page is fetched before returning, so a bad argument raises
+    HTTPException(400) while a normal response can still be sent. Each
+    later page is fetched only when the previous one has been written, and
+    no lock is held in between.
+    """
+    first = _page_or_400(fetch, cursor="", limit=EXPORT_PAGE_SIZE, **kwargs)
+
+    def pages():
+        page = first
+        while True:
+            yield page["items"]
+            if page["nextCursor"] is None:
+                return
+            page = fetch(cursor=page["nextCursor"], limit=EXPORT_PAGE_SIZE, **kwargs)
+
+    return pages()
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+def _export_chunks(pages, export_format: str, fields):
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for items in pages:
+            writer.writerows([_csv_cell(item.get(f)) for f in fields] for item in items)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        for items in pages:
+            yield b"".join([encode_json(item) + b"\n" for item in items])
+
+
+def _export_response(pages, export_format: str, fields, filename: str):
+    """Stream ``pages`` as NDJSON (one record per line) or CSV with a
+    header row. Memory use is one page, whatever the number of records."""
+    return StreamingResponse(
+        _export_chunks(pages, export_format, fields),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+def _export_format(export_format: str) -> str:
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}"
+        )
+    return export_format
+
 
 # Products
+def _product_filters(min_price, max_price, min_rating, in_stock) -> dict:
+    return {
+        "minPrice": min_price,
+        "maxPrice": max_price,
+        "minRating": min_rating,
+        "inStock": in_stock,
+    }
+
+
 @app.get("/api/products")
 async def get_products(
+    request: Request,
     category: Optional[str] = None,
     search: Optional[str] = None,
-    limit: Optional[int] = None,
-    offset: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    seller: Optional[str] = None,
+    min_price: Optional[str] = None,
+    max_price: Optional[str] = None,
+    min_rating: Optional[str] = None,
+    in_stock: bool = False,
+    sort: Optional[str] = None,
 ):
-    return storage.get_products(
-        category_id=category, search=search, limit=limit, offset=offset
-    )
+    filters = _product_filters(min_price, max_price, min_rating, in_stock)
+
+    def build():
+        if cursor is not None:
+            return _page_or_400(
+                storage.get_products_page_json,
+                category_id=category,
+                search=search,
+                seller_id=seller,
+                cursor=cursor,
+                limit=limit,
+                filters=filters,
+                sort=sort,
+            )
+        return _page_or_400(
+            storage.get_products_json,
+            category_id=category,
+            search=search,
+            seller_id=seller,
+            limit=limit,
+            offset=offset,
+            filters=filters,
+            sort=sort,
+        )
+
+    return _cached_json(request, "products", build)
+
+
+@app.get("/api/products/facets")
+async def get_product_facets(
+    request: Request,
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    seller: Optional[str] = None,
+    min_price: Optional[str] = None,
+    max_price: Optional[str] = None,
+    min_rating: Optional[str] = None,
+    in_stock: bool = False,
+):
+    filters = _product_filters(min_price, max_price, min_rating, in_stock)
+
+    def build():
+        facets = _page_or_400(
+            storage.get_product_facets,
+            category_id=category,
+            search=search,
+            seller_id=seller,
+            filters=filters,
+        )
+        return encode_json(facets)
+
+    return _cached_json(request, "products", build)
 
 
 @app.get("/api/products/{product_id}")
-async def get_product(product_id: str):
-    product = storage.get_product(product_id)
-    if not product:
+async def get_product(request: Request, product_id: str):
+    def build():
+        product = storage.get_product_json(product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return product
+
+    return _cached_json(request, "products", build)
+
+
+@app.get("/api/products/{product_id}/related")
+async def get_related_products(
+    product_id: str, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
+):
+    body = storage.get_related_json(product_id, limit)
+    if body is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return Response(body, media_type="application/json")
 
-@app.get("/api/review")
-async def get_review():
-    product = [{
-                "quote": "I found exactly what I was looking for! The quality is outstanding and the seller was incredibly responsive. Will definitely shop here again.",
-                "name": "Sarah Mitchell",
-                "role": "Customer",
-                "avatar": "https://unsplash.com/photos/closeup-photography-of-woman-smiling-mEZ3PoFGs_k",
-            }]
-    if not product:
+
+@app.get("/api/products/{product_id}/reviews")
+async def get_product_reviews(
+    product_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    page = _page_or_400(
+        storage.get_reviews_page, product_id=product_id, cursor=cursor, limit=limit
+    )
+    if page is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return page
+
+
+@app.post("/api/products/{product_id}/reviews")
+async def create_review(product_id: str, review: CreateReviewRequest):
+    review_data = {k: v for k, v in review.dict().items() if v is not None}
+    try:
+        result = storage.add_review(product_id, review_data)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if result is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    await _commit()
+    return result
+
+
+@app.get("/api/review")
+async def get_review(request: Request, limit: int = Query(3, ge=1, le=MAX_PAGE_SIZE)):
+    # The homepage testimonials: the best-rated reviews.
+    return _cached_json(
+        request, "products", lambda: encode_json(storage.get_top_reviews(limit))
+    )
+
 
 @app.post("/api/products")
 async def create_product(product: CreateProductRequest):
-    return storage.create_product(product.dict())
+    try:
+        result = storage.create_product(product.dict())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    await _commit()
+    return result
+
+
+@app.post("/api/products:batch")
+async def create_products_batch(items: List[dict]):
+    payloads, results = _validate_batch(CreateProductRequest, items)
+    applied = storage.create_products([p for p in payloads if p is not None])
+    await _commit()
+    return _merge_batch_results(results, applied, created=True)
+
+
+IMPORT_SPOOL_BYTES = 16 * 1024 * 1024
+
+
+@app.post("/api/products:import")
+async def import_products(
+    request: Request,
+    feed_format: str = Query("ndjson", alias="format"),
+    workers: int = 0,
+):
+    """Upsert a product feed (NDJSON or CSV body) and stream NDJSON
+    progress reports, one per chunk, ending with one whose "done" is true.
+    """
+    feed_format = _export_format(feed_format)
+    workers = max(0, min(workers, os.cpu_count() or 1))
+    # The body is spooled (to disk past IMPORT_SPOOL_BYTES) rather than
+    # parsed while it arrives, so the import can run on a worker thread.
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+
+    def progress():
+        with io.TextIOWrapper(spool, encoding="utf-8", newline="") as lines:
+            for report in import_feed(storage, read_feed(lines, feed_format), workers=workers):
+                if report["done"]:
+                    storage.sync()
+                yield encode_json(report) + b"\n"
+
+    return StreamingResponse(progress(), media_type=EXPORT_FORMATS["ndjson"])
 
 
 @app.patch("/api/products/{product_id}")
 async def update_product(product_id: str, product: UpdateProductRequest):
     updates = {k: v for k, v in product.dict().items() if v is not None}
-    result = storage.update_product(product_id, updates)
+    try:
+        result = storage.update_product(product_id, updates)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     if not result:
         raise HTTPException(status_code=404, detail="Product not found")
+    await _commit()
     return result
 
 
@@ -543,63 +4320,77 @@ async def update_product(product_id: str, product: UpdateProductRequest):
 async def delete_product(product_id: str):
     if not storage.delete_product(product_id):
         raise HTTPException(status_code=404, detail="Product not found")
+    await _commit()
     return {"status": "deleted"}
 
 
 # Categories
 @app.get("/api/categories")
-async def get_categories():
-    return storage.get_categories()
+async def get_categories(request: Request):
+    return _cached_json(request, "categories", storage.get_categories_json)
 
 
 @app.get("/api/categories/{category_id}")
-async def get_category(category_id: str):
-    category = storage.get_category(category_id)
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    return category
+async def get_category(request: Request, category_id: str):
+    def build():
+        category = storage.get_category_json(category_id)
+        if not category:
+            raise HTTPException(status_code=404, detail="Category not found")
+        return category
+
+    return _cached_json(request, "categories", build)
 
 
 # Cart
 @app.get("/api/cart")
-async def get_cart(request: Request):
+async def get_cart(request: Request, summary: bool = False):
     session_id = request.headers.get("X-Session-ID", "default-session")
-    cart_items = storage.get_cart_items(session_id)
-    enriched_items = []
-    for item in cart_items:
-        product = storage.get_product(item["productId"])
-        enriched_items.append({"session": item, "product": product})
-    return enriched_items
+    cart = storage.get_cart(session_id)
+    return cart if summary else cart["items"]
+
+
+@app.get("/api/cart/summary")
+async def get_cart_summary(request: Request):
+    session_id = request.headers.get("X-Session-ID", "default-session")
+    return storage.get_cart_summary(session_id)
 
 
 @app.post("/api/cart")
 async def add_to_cart(request: Request, cart_data: AddToCartRequest):
     session_id = request.headers.get("X-Session-ID", "default-session")
 
-    # Check if item exists
-    existing_items = storage.get_cart_items(session_id)
-    existing_item = next(
-        (i for i in existing_items if i["productId"] == cart_data.productId), None
-    )
-
-    if existing_item:
-        # Update quantity
-        updated = storage.update_cart_item(
-            existing_item["id"], existing_item["quantity"] + cart_data.quantity
+    # Merges into the session's existing line for the product, atomically.
+    try:
+        item = storage.add_to_cart(
+            {
+                "sessionId": session_id,
+                "productId": cart_data.productId,
+                "quantity": cart_data.quantity,
+            }
         )
-        return updated
-
-    # Add new item
-    item = storage.add_to_cart(
-        {
-            "sessionId": session_id,
-            "productId": cart_data.productId,
-            "quantity": cart_data.quantity,
-        }
-    )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    await _commit()
     return item
 
 
+@app.patch("/api/cart:batch")
+async def update_cart_batch(request: Request, items: List[dict]):
+    session_id = request.headers.get("X-Session-ID", "default-session")
+    payloads, results = _validate_batch(CartChangeRequest, items)
+    for index, payload in enumerate(payloads):
+        if payload is not None and (payload["id"] is None) == (payload["productId"] is None):
+            payloads[index] = None
+            results[index] = {
+                "index": index,
+                "status": 400,
+                "error": "Exactly one of id or productId is required",
+            }
+    applied = storage.update_cart(session_id, [p for p in payloads if p is not None])
+    await _commit()
+    return _merge_batch_results(results, applied)
+
+
 @app.patch("/api/cart/{item_id}")
 async def update_cart_item(item_id: str, data: UpdateCartItemRequest):
     if data.quantity < 1:
@@ -607,6 +4398,7 @@ async def update_cart_item(item_id: str, data: UpdateCartItemRequest):
     result = storage.update_cart_item(item_id, data.quantity)
     if not result:
         raise HTTPException(status_code=404, detail="Cart item not found")
+    await _commit()
     return result
 
 
@@ -614,32 +4406,365 @@ async def update_cart_item(item_id: str, data: UpdateCartItemRequest):
 async def remove_from_cart(item_id: str):
     if not storage.remove_from_cart(item_id):
         raise HTTPException(status_code=404, detail="Cart item not found")
+    await _commit()
     return {"status": "deleted"}
 
 
 # Orders
 @app.get("/api/seller/orders")
-async def get_seller_orders(seller_id: Optional[str] = "seller-1"):
+async def get_seller_orders(
+    seller_id: Optional[str] = "seller-1",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
+    # A date range is only served paginated, like ?cursor=.
+    if cursor is not None or since or until:
+        return _page_or_400(
+            storage.get_orders_page,
+            seller_id=seller_id,
+            cursor=cursor,
+            limit=limit,
+            since=since,
+            until=until,
+        )
     return storage.get_orders(seller_id)
 
 
+@app.get("/api/seller/orders/export")
+async def export_seller_orders(
+    seller_id: Optional[str] = "seller-1",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    export_format: str = Query("ndjson", alias="format"),
+):
+    """Every order of the seller created in [since, until), newest first."""
+    export_format = _export_format(export_format)
+    pages = _export_pages(
+        storage.get_orders_page, seller_id=seller_id, since=since, until=until
+    )
+    return _export_response(pages, export_format, ORDER_EXPORT_FIELDS, f"orders-{seller_id}")
+
+
 @app.post("/api/orders")
 async def create_order(order: CreateOrderRequest):
-    return storage.create_order(order.dict())
+    try:
+        result = storage.create_order(order.dict())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    await _commit()
+    return result
+
+
+@app.post("/api/checkout")
+async def checkout(request: Request, data: CheckoutRequest):
+    session_id = request.headers.get("X-Session-ID", "default-session")
+    try:
+        result = storage.checkout(session_id, data.dict())
+    except CheckoutError as exc:
+        raise HTTPException(
+            status_code=409, detail={"message": str(exc), "problems": exc.problems}
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    await _commit()
+    return result
+
+
+@app.post("/api/orders:batch")
+async def create_orders_batch(items: List[dict]):
+    payloads, results = _validate_batch(CreateOrderRequest, items)
+    applied = storage.create_orders([p for p in payloads if p is not None])
+    await _commit()
+    return _merge_batch_results(results, applied, created=True)
 
 
 # Seller
 @app.get("/api/seller/products")
-async def get_seller_products(seller_id: Optional[str] = "seller-1"):
+async def get_seller_products(
+    seller_id: Optional[str] = "seller-1",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    if cursor is not None:
+        return _page_or_400(
+            storage.get_products_page, seller_id=seller_id, cursor=cursor, limit=limit
+        )
     return storage.get_products(seller_id=seller_id)
 
 
+@app.get("/api/seller/products/export")
+async def export_seller_products(
+    seller_id: Optional[str] = "seller-1",
+    export_format: str = Query("ndjson", alias="format"),
+):
+    """Every product of the seller, in creation order."""
+    export_format = _export_format(export_format)
+    pages = _export_pages(storage.get_products_page, seller_id=seller_id)
+    return _export_response(pages, export_format, ProductRecord.FIELDS, f"products-{seller_id}")
+
+
 @app.get("/api/seller/stats")
-async def get_seller_stats(seller_id: Optional[str] = "seller-1"):
+async def get_seller_stats(seller_id: Optional[str] = "seller-1", check: bool = False):
+    if check:
+        return storage.check_seller_stats(seller_id)
     return storage.get_seller_stats(seller_id)
 
 
+@app.get("/api/seller/stats/timeseries")
+async def get_seller_sales_timeseries(
+    seller_id: Optional[str] = "seller-1",
+    interval: str = "day",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    product_id: Optional[str] = None,
+):
+    try:
+        return storage.get_sales_timeseries(
+            seller_id, interval=interval, since=since, until=until, product_id=product_id
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+# Events
+SSE_HEARTBEAT = 15.0
+SSE_MAX_TOPICS = 100
+
+
+@app.get("/api/events")
+async def stream_events(
+    product: List[str] = Query(default=[]),
+    seller: List[str] = Query(default=[]),
+):
+    """Server-sent change events for the given products and sellers.
+
+    A product page hears "product" and "productDeleted"; a seller dashboard
+    also hears "order" and "stats". Each event's data is the new state,
+    as the matching GET would return it. After a "reset" event the
+    client should re-read what it shows.
+    """
+    topics = [f"product:{p}" for p in product] + [f"seller:{s}" for s in seller]
+    if not topics or len(topics) > SSE_MAX_TOPICS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Subscribe to between 1 and {SSE_MAX_TOPICS} products or sellers",
+        )
+
+    async def stream():
+        subscriber = await event_hub.subscribe(topics)
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                reset, frames = subscriber.take()
+                if reset:
+                    event_hub.resets += 1
+                    frames.insert(0, b"event: reset\ndata: {}\n\n")
+                event_hub.delivered += len(frames)
+                # While this write waits on a slow client, newer events
+                # coalesce in the subscriber's buffer.
+                yield b"".join(frames)
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+# Static assets
+ASSETS_DIR = os.environ.get(
+    "SHOP_ASSETS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "attached_assets"),
+)
+# Asset files are never changed in place (a new image gets a new name), so
+# browsers and proxies may keep them for a year without revalidating.
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class AssetFiles(StaticFiles):
+    """Files under ASSETS_DIR with long-lived cache headers.
+
+    Starlette's FileResponse answers Range and If-Range, StaticFiles
+    answers If-None-Match and If-Modified-Since with 304, and on servers
+    that offer the ASGI pathsend extension a whole file is handed to the
+    server to send instead of being read through Python.
+    """
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+        return response
+
+
+app.mount("/assets", AssetFiles(directory=ASSETS_DIR, check_dir=False), name="assets")
+
+
+# Internal
+@app.get("/internal/cache")
+async def get_cache_stats():
+    return response_cache.stats()
+
+
+@app.get("/internal/admission")
+async def get_admission_stats():
+    return admission.stats()
+
+
+@app.get("/internal/carts")
+async def get_cart_stats():
+    return storage.get_cart_stats()
+
+
+@app.get("/internal/metrics")
+async def get_metrics():
+    # Request metrics are this worker's; storage metrics come from whichever
+    # process owns the storage.
+    carts = storage.get_cart_stats()
+    cache = response_cache.stats()
+    events = event_hub.stats()
+    related = storage.get_related_stats()
+    control = admission.stats()
+    gauges = [
+        ("shop_cart_live_sessions", "gauge", carts["liveSessions"]),
+        ("shop_cart_items", "gauge", carts["cartItems"]),
+        ("shop_cart_evicted_sessions_total", "counter", carts["evictedSessions"]),
+        ("shop_cart_evicted_items_total", "counter", carts["evictedItems"]),
+        ("shop_cart_reclaimed_bytes_total", "counter", carts["reclaimedBytes"]),
+        ("shop_response_cache_hits_total", "counter", cache["hits"]),
+        ("shop_response_cache_misses_total", "counter", cache["misses"]),
+        ("shop_response_cache_compressions_total", "counter", cache["compressions"]),
+        ("shop_response_compressed_bytes_total", "counter", cache["bytesCompressed"]),
+        ("shop_events_subscribers", "gauge", events["subscribers"]),
+        ("shop_events_delivered_total", "counter", events["delivered"]),
+        ("shop_events_coalesced_total", "counter", events["coalesced"]),
+        ("shop_events_resets_total", "counter", events["resets"]),
+        ("shop_related_products", "gauge", related["products"]),
+        ("shop_related_pending", "gauge", related["pending"]),
+        ("shop_related_dropped_total", "counter", related["dropped"]),
+        ("shop_admission_in_flight", "gauge", control["inFlight"]),
+        ("shop_admission_queued", "gauge", sum(control["queued"].values())),
+        ("shop_admission_congested", "gauge", int(control["congested"])),
+        ("shop_admission_queue_delay_seconds", "gauge", admission.queue_delay),
+        ("shop_admission_admitted_total", "counter", sum(admission.admitted)),
+        ("shop_admission_shed_total", "counter", sum(admission.shed)),
+        ("shop_admission_rate_limited_total", "counter", admission.rate_limited),
+    ]
+    body = request_metrics.render("shop_http", "route") + storage.render_metrics()
+    body += "".join(f"# TYPE {name} {kind}\n{name} {value}\n" for name, kind, value in gauges)
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def import_main(argv) -> int:
+    """``python server/main.py import FEED``: bulk-load a product feed."""
+    parser = argparse.ArgumentParser(
+        prog="main.py import",
+        description="Upsert an NDJSON or CSV product feed, either into the storage "
+        "configured by SHOP_DATA_DIR or, with --url, into a running server",
+    )
+    parser.add_argument("feed")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), help="default: from the file name")
+    parser.add_argument("--workers", type=int, default=0, help="validation processes")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--url", help="server to send the feed to, e.g. http://localhost:5000")
+    args = parser.parse_args(argv)
+    feed_format = args.format or ("csv" if args.feed.endswith(".csv") else "ndjson")
+
+    if args.url:
+        import urllib.request
+
+        query = f"format={feed_format}&workers={args.workers}"
+        with open(args.feed, "rb") as body:
+            request = urllib.request.Request(
+                f"{args.url.rstrip('/')}/api/products:import?{query}",
+                data=body,
+                headers={"Content-Length": str(os.path.getsize(args.feed))},
+                method="POST",
+            )
+            with urllib.request.urlopen(request) as response:
+                reports = (json.loads(line) for line in response)
+                report = _print_import_progress(reports)
+    else:
+        if not DURABLE:
+            print("warning: SHOP_DATA_DIR is not set, the import only lives in memory")
+        # Everything loaded stays alive, so collection passes over the
+        # growing heap are pure overhead; this process exits afterwards.
+        gc.disable()
+        with open(args.feed, newline="", encoding="utf-8") as lines:
+            rows = read_feed(lines, feed_format)
+            report = _print_import_progress(
+                import_feed(storage, rows, args.chunk_size, args.workers)
+            )
+        storage.snapshot()
+        storage.close()
+    return 1 if report["failed"] else 0
+
+
+def _print_import_progress(reports) -> dict:
+    last_print = 0.0
+    for report in reports:
+        for error in report["errors"]:
+            print(f"row {error['row']}: {error['error']}")
+        if not report["done"] and time.monotonic() - last_print < 1.0:
+            continue
+        last_print = time.monotonic()
+        rate = report["rows"] / report["seconds"] if report["seconds"] else 0
+        print(
+            f"{'done' if report['done'] else 'rows'} {report['rows']}: "
+            f"{report['created']} created, {report['updated']} updated, "
+            f"{report['failed']} failed ({report['seconds']:.1f}s, {rate:.0f} rows/s)",
+            flush=True,
+        )
+    return report
+
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+    if sys.argv[1:2] == ["import"]:
+        sys.exit(import_main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="ShopHub API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="uvicorn worker processes; with more than one, this process "
+        "owns the storage and serves it to the workers",
+    )
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port)
+    else:
+        # A Unix socket avoids the Nagle/delayed-ACK stalls TCP adds to
+        # the manager's small request/response messages.
+        authkey = os.urandom(16)
+        socket_dir = tempfile.mkdtemp(prefix="shop-storage-")
+        address = serve_storage(get_storage(), os.path.join(socket_dir, "storage.sock"), authkey)
+        os.environ["SHOP_STORAGE_ADDRESS"] = address
+        os.environ["SHOP_STORAGE_AUTHKEY"] = authkey.hex()
+        # uvicorn creates the shared listener with proto=0, so asyncio never
+        # sets TCP_NODELAY on accepted connections and keep-alive responses
+        # stall on delayed ACKs. Re-wrap the listener as an explicit TCP socket.
+        bind_socket = uvicorn.Config.bind_socket
+
+        def bind_tcp_socket(config):
+            sock = bind_socket(config)
+            if sock.family in (socket.AF_INET, socket.AF_INET6):
+                sock = socket.socket(sock.family, sock.type, socket.IPPROTO_TCP, sock.detach())
+            return sock
+
+        uvicorn.Config.bind_socket = bind_tcp_socket
+        module = __spec__.name if __spec__ else "main"
+        uvicorn.run(f"{module}:app", host=args.host, port=args.port, workers=args.workers)
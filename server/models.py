@@ -0,0 +1,126 @@
+"""Pydantic models of the API's records and request bodies."""
+
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+
+# Data Models
+class Category(BaseModel):
+    id: str
+    name: str
+    slug: str
+    image: str
+
+
+class Product(BaseModel):
+    id: str
+    name: str
+    description: str
+    price: str
+    categoryId: str
+    categoryName: str
+    image: str
+    images: List[str]
+    sellerId: str
+    sellerName: str
+    stock: int
+    status: str
+    rating: str
+    reviewCount: int
+
+
+class CartItem(BaseModel):
+    id: str
+    sessionId: str
+    productId: str
+    quantity: int
+
+
+class Order(BaseModel):
+    id: str
+    sellerId: str
+    buyerName: str
+    buyerEmail: str
+    total: str
+    status: str
+    createdAt: datetime
+
+
+class SellerStats(BaseModel):
+    revenue: float
+    activeListings: int
+    totalOrders: int
+    avgOrderValue: float
+
+
+# Request Models
+class CreateProductRequest(BaseModel):
+    name: str
+    description: str
+    price: str
+    categoryId: str
+    categoryName: str
+    image: str
+    images: List[str]
+    sellerId: str
+    sellerName: str
+    stock: int
+    status: str
+
+
+class ImportProductRequest(CreateProductRequest):
+    # An existing product's id updates that product.
+    id: Optional[str] = None
+
+
+class UpdateProductRequest(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[str] = None
+    categoryId: Optional[str] = None
+    categoryName: Optional[str] = None
+    image: Optional[str] = None
+    images: Optional[List[str]] = None
+    sellerId: Optional[str] = None
+    sellerName: Optional[str] = None
+    stock: Optional[int] = None
+    status: Optional[str] = None
+
+
+class AddToCartRequest(BaseModel):
+    productId: str
+    quantity: int = Field(ge=1)
+
+
+class UpdateCartItemRequest(BaseModel):
+    quantity: int
+
+
+class CreateOrderRequest(BaseModel):
+    sellerId: str
+    buyerName: str
+    buyerEmail: str
+    total: str
+    status: str
+
+
+class CreateReviewRequest(BaseModel):
+    rating: int
+    quote: str
+    name: str
+    role: Optional[str] = None
+    avatar: Optional[str] = None
+
+
+class CheckoutRequest(BaseModel):
+    buyerName: str
+    buyerEmail: str
+
+
+class CartChangeRequest(BaseModel):
+    # Either an existing cart line `id` (quantity 0 removes it) or a
+    # `productId` whose quantity is added to the session's cart.
+    id: Optional[str] = None
+    productId: Optional[str] = None
+    quantity: int